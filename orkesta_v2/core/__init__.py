@@ -8,6 +8,8 @@ Este módulo contiene el cerebro de la aplicación:
 - Aprendizaje continuo y adaptación
 """
 
+from dataclasses import replace
+
 from .verification import AIVerificationEngine
 from .decisions import DecisionEngine
 from .learning import ContinuousLearningEngine
@@ -21,19 +23,29 @@ class OrkestaCore:
         self.verification = AIVerificationEngine()
         self.decisions = DecisionEngine()
         self.learning = ContinuousLearningEngine()
+        self._reject_cache = {}  # Respuestas de rechazo compartidas por razón
         
     async def process_request(self, request_data, context):
-        """Procesa cualquier request con verificación IA multicapa"""
+        """Procesa cualquier request con verificación IA multicapa
+        
+        Las respuestas de rechazo se reutilizan por razón: tratarlas como
+        solo lectura.
+        """
         # 1. Verificación de entrada
         verification_result = await self.verification.verify_input(request_data, context)
         
         if not verification_result.is_valid:
-            return {"status": "rejected", "reason": verification_result.reason}
+            reason = verification_result.reason
+            response = self._reject_cache.get(reason)
+            if response is None:
+                response = self._reject_cache[reason] = {"status": "rejected", "reason": reason}
+            return response
             
         # 2. Toma de decisión
         decision = await self.decisions.make_decision(request_data, context, verification_result)
         
-        # 3. Aprendizaje continuo
-        await self.learning.record_interaction(request_data, decision, context)
+        # 3. Aprendizaje continuo. El ID permite reportar el resultado real
+        #    después con learning.learn_from_outcome(decision.decision_id, ...)
+        decision_id = await self.learning.record_interaction(request_data, decision, context)
         
-        return decision
\ No newline at end of file
+        return replace(decision, decision_id=decision_id)
\ No newline at end of file
@@ -4,11 +4,24 @@ Toma decisiones inteligentes basadas en contexto y verificación
 """
 
 import asyncio
+from bisect import bisect_left
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+from ._kernels import SALES_TREND_CODES, business_health, weighted_risk
+
+# Límites superiores de las bandas de monto para cash flow
+_CASH_FLOW_AMOUNT_LIMITS = (10000, 50000)
+
+# Tiers de cliente por volumen (MXN) y transacciones, ambos estrictamente mayores.
+# Listas mutables: el aprendizaje puede ajustar umbrales sin cambiar código.
+TIER_VOLUME_BREAKS = [20_000, 100_000, 500_000]
+TIER_MIN_TRANSACTIONS = [5, 20, 50]
+TIER_NAMES = ['silver', 'gold', 'platinum']
+
+
 class DecisionType(Enum):
     APPROVE = "approve"
     REJECT = "reject" 
@@ -16,7 +29,7 @@ class DecisionType(Enum):
     ESCALATE = "escalate"
     MODIFY = "modify"
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Decision:
     type: DecisionType
     confidence: float
@@ -24,6 +37,7 @@ class Decision:
     actions: List[Dict[str, Any]]
     conditions: Optional[Dict[str, Any]] = None
     expiry: Optional[datetime] = None
+    decision_id: Optional[int] = None  # Asignado al registrarla para aprendizaje
 
 class DecisionEngine:
     """Motor de decisiones autónomas - Cerebro de Orkesta"""
@@ -36,14 +50,21 @@ class DecisionEngine:
     async def make_decision(self, data: Dict[Any, Any], context: Dict[str, Any], verification_result) -> Decision:
         """Toma decisión inteligente basada en todos los factores"""
         
+        # Un solo timestamp para toda la decisión
+        now = datetime.now()
+        
+        # Contexto y riesgo son independientes entre sí. Hoy son cálculo
+        # síncrono en memoria; cuando consulten BD/modelos, correrlos con
+        # asyncio.gather para que la latencia sea max(analyze, risk).
+        
         # Analizar contexto completo
-        context_analysis = await self.context_analyzer.analyze(data, context)
+        context_analysis = self.context_analyzer.analyze(data, context, now)
         
         # Calcular riesgo
-        risk_score = await self.risk_calculator.calculate_risk(data, context, verification_result)
+        risk_score = self.risk_calculator.calculate_risk(data, context, verification_result, now)
         
         # Aplicar reglas de decisión
-        decision = await self.decision_rules.evaluate(data, context_analysis, risk_score, verification_result)
+        decision = self.decision_rules.evaluate(data, context_analysis, risk_score, verification_result)
         
         return decision
 
@@ -51,34 +72,59 @@ class DecisionEngine:
 class DecisionRuleEngine:
     """Motor de reglas de decisión inteligente"""
     
-    async def evaluate(self, data, context_analysis, risk_score, verification_result) -> Decision:
+    def __init__(self):
+        # Dispatch por (type, channel); None actúa como comodín.
+        # Prioridad: cash flow > WhatsApp > pagos > default
+        self._dispatch = {
+            ('cash_flow_request', None): self._decide_cash_flow,   # Prioridad #1
+            (None, 'whatsapp'): self._decide_whatsapp_commerce,     # Prioridad #2
+            ('payment', 'whatsapp'): self._decide_whatsapp_commerce,
+            ('payment', None): self._decide_payment,                # Prioridad #3
+        }
+        
+        # Reglas de pago indexadas por método (nodo raíz de la red)
+        self._payment_rules = {
+            'oxxo': self._payment_oxxo,
+            'cash': self._payment_cash,
+            'stripe': self._payment_stripe,
+        }
+    
+    def evaluate(self, data, context_analysis, risk_score, verification_result) -> Decision:
         """Evalúa y toma decisión final"""
         
-        # CASH FLOW MANAGEMENT - Prioridad #1
-        if data.get('type') == 'cash_flow_request':
-            return await self._decide_cash_flow(data, context_analysis, risk_score, verification_result)
-            
-        # WHATSAPP COMMERCE - Prioridad #2  
-        elif data.get('channel') == 'whatsapp':
-            return await self._decide_whatsapp_commerce(data, context_analysis, risk_score, verification_result)
-            
-        # PAYMENTS - Prioridad #3
-        elif data.get('type') == 'payment':
-            return await self._decide_payment(data, context_analysis, risk_score, verification_result)
-            
-        # Default decision
-        else:
-            return await self._decide_default(data, context_analysis, risk_score, verification_result)
+        request_type = data.get('type')
+        channel = data.get('channel')
+        dispatch = self._dispatch
+        
+        # Valores no-str (listas/dicts de JSON) no coinciden con ninguna regla,
+        # igual que con comparaciones ==; además no serían hashables como llave
+        if not isinstance(request_type, str):
+            request_type = None
+        if not isinstance(channel, str):
+            channel = None
+        
+        # Llave exacta, luego comodín en channel, luego comodín en type
+        handler = (
+            dispatch.get((request_type, channel))
+            or dispatch.get((request_type, None))
+            or dispatch.get((None, channel))
+            or self._decide_default
+        )
+        
+        return handler(data, context_analysis, risk_score, verification_result)
     
-    async def _decide_cash_flow(self, data, context_analysis, risk_score, verification_result) -> Decision:
+    def _decide_cash_flow(self, data, context_analysis, risk_score, verification_result) -> Decision:
         """Decisiones para Cash Flow Management"""
         
         amount = data.get('amount', 0)
         business_health = context_analysis.get('business_health_score', 0.5)
         payment_history = context_analysis.get('payment_history_score', 0.5)
         
+        # Nodo raíz: banda de monto (<=10k, <=50k, mayor), evaluada una vez
+        amount_band = bisect_left(_CASH_FLOW_AMOUNT_LIMITS, amount)
+        
         # Flujo de efectivo crítico - decisión inmediata
-        if amount <= 10000 and business_health > 0.7 and payment_history > 0.6:
+        if amount_band == 0 and business_health > 0.7 and payment_history > 0.6:
             return Decision(
                 type=DecisionType.APPROVE,
                 confidence=0.9,
@@ -91,7 +137,7 @@ class DecisionRuleEngine:
             )
             
         # Monto medio - verificación adicional
-        elif amount <= 50000:
+        elif amount_band <= 1:
             return Decision(
                 type=DecisionType.REVIEW,
                 confidence=0.75,
@@ -117,7 +163,7 @@ class DecisionRuleEngine:
                 ]
             )
     
-    async def _decide_whatsapp_commerce(self, data, context_analysis, risk_score, verification_result) -> Decision:
+    def _decide_whatsapp_commerce(self, data, context_analysis, risk_score, verification_result) -> Decision:
         """Decisiones para WhatsApp Commerce"""
         
         message_type = data.get('message_type', 'text')
@@ -164,79 +210,83 @@ class DecisionRuleEngine:
                 ]
             )
     
-    async def _decide_payment(self, data, context_analysis, risk_score, verification_result) -> Decision:
+    def _decide_payment(self, data, context_analysis, risk_score, verification_result) -> Decision:
         """Decisiones para pagos"""
         
         payment_method = data.get('payment_method', 'unknown')
-        amount = data.get('amount', 0)
         
-        # OXXO payments - siempre requieren verificación adicional
-        if payment_method == 'oxxo':
-            return Decision(
-                type=DecisionType.REVIEW,
-                confidence=0.9,
-                reasoning="Pago OXXO requiere verificación de voucher",
-                actions=[
-                    {"type": "generate_oxxo_voucher"},
-                    {"type": "send_payment_instructions"},
-                    {"type": "monitor_payment_status"},
-                    {"type": "auto_reconcile_on_confirmation"}
-                ],
-                expiry=datetime.now() + timedelta(days=3)  # 3 días para pagar
-            )
-            
-        # Pagos en efectivo - verificación física
-        elif payment_method == 'cash':
-            return Decision(
-                type=DecisionType.ESCALATE,
-                confidence=0.7,
-                reasoning="Pago en efectivo requiere verificación física",
-                actions=[
-                    {"type": "schedule_cash_collection"},
-                    {"type": "assign_collection_agent"},
-                    {"type": "verify_amount_physically"},
-                    {"type": "issue_receipt"}
-                ]
-            )
-            
-        # Stripe/tarjetas - procesamiento normal
-        elif payment_method == 'stripe':
-            if risk_score < 0.4:
-                return Decision(
-                    type=DecisionType.APPROVE,
-                    confidence=0.9,
-                    reasoning="Pago con tarjeta de bajo riesgo",
-                    actions=[
-                        {"type": "process_stripe_payment"},
-                        {"type": "send_confirmation"},
-                        {"type": "update_accounting"}
-                    ]
-                )
-            else:
-                return Decision(
-                    type=DecisionType.REVIEW,
-                    confidence=0.6,
-                    reasoning="Pago con tarjeta de alto riesgo",
-                    actions=[
-                        {"type": "additional_card_verification"},
-                        {"type": "check_fraud_indicators"},
-                        {"type": "manual_approval_if_needed"}
-                    ]
-                )
+        # Nodo de discriminación: un solo lookup por método de pago
+        # (sólo str: un valor no hashable de JSON cae en "no soportado")
+        rule = self._payment_rules.get(payment_method) if isinstance(payment_method, str) else None
+        if rule is not None:
+            return rule(data, risk_score)
         
         # Método de pago desconocido
-        else:
+        return Decision(
+            type=DecisionType.REJECT,
+            confidence=0.95,
+            reasoning=f"Método de pago no soportado: {payment_method}",
+            actions=[
+                {"type": "send_supported_methods_list"},
+                {"type": "log_unsupported_request"}
+            ]
+        )
+    
+    def _payment_oxxo(self, data, risk_score) -> Decision:
+        """OXXO payments - siempre requieren verificación adicional"""
+        return Decision(
+            type=DecisionType.REVIEW,
+            confidence=0.9,
+            reasoning="Pago OXXO requiere verificación de voucher",
+            actions=[
+                {"type": "generate_oxxo_voucher"},
+                {"type": "send_payment_instructions"},
+                {"type": "monitor_payment_status"},
+                {"type": "auto_reconcile_on_confirmation"}
+            ],
+            expiry=datetime.now() + timedelta(days=3)  # 3 días para pagar
+        )
+    
+    def _payment_cash(self, data, risk_score) -> Decision:
+        """Pagos en efectivo - verificación física"""
+        return Decision(
+            type=DecisionType.ESCALATE,
+            confidence=0.7,
+            reasoning="Pago en efectivo requiere verificación física",
+            actions=[
+                {"type": "schedule_cash_collection"},
+                {"type": "assign_collection_agent"},
+                {"type": "verify_amount_physically"},
+                {"type": "issue_receipt"}
+            ]
+        )
+    
+    def _payment_stripe(self, data, risk_score) -> Decision:
+        """Stripe/tarjetas - procesamiento normal"""
+        if risk_score < 0.4:
             return Decision(
-                type=DecisionType.REJECT,
-                confidence=0.95,
-                reasoning=f"Método de pago no soportado: {payment_method}",
+                type=DecisionType.APPROVE,
+                confidence=0.9,
+                reasoning="Pago con tarjeta de bajo riesgo",
                 actions=[
-                    {"type": "send_supported_methods_list"},
-                    {"type": "log_unsupported_request"}
+                    {"type": "process_stripe_payment"},
+                    {"type": "send_confirmation"},
+                    {"type": "update_accounting"}
                 ]
             )
+        
+        return Decision(
+            type=DecisionType.REVIEW,
+            confidence=0.6,
+            reasoning="Pago con tarjeta de alto riesgo",
+            actions=[
+                {"type": "additional_card_verification"},
+                {"type": "check_fraud_indicators"},
+                {"type": "manual_approval_if_needed"}
+            ]
+        )
     
-    async def _decide_default(self, data, context_analysis, risk_score, verification_result) -> Decision:
+    def _decide_default(self, data, context_analysis, risk_score, verification_result) -> Decision:
         """Decisión por defecto para casos no específicos"""
         
         if risk_score < 0.3 and verification_result.confidence > 0.8:
@@ -265,58 +315,51 @@ class DecisionRuleEngine:
 class ContextAnalyzer:
     """Analiza el contexto completo de la decisión"""
     
-    async def analyze(self, data, context) -> Dict[str, Any]:
+    def analyze(self, data, context, now: datetime) -> Dict[str, Any]:
         """Análisis completo del contexto"""
         
         analysis = {}
         
         # Análisis del negocio
-        analysis['business_health_score'] = await self._analyze_business_health(context)
+        analysis['business_health_score'] = self._analyze_business_health(context)
         
         # Análisis del cliente
-        analysis['customer_tier'] = await self._analyze_customer_tier(context)
-        analysis['payment_history_score'] = await self._analyze_payment_history(context)
+        analysis['customer_tier'] = self._analyze_customer_tier(context)
+        analysis['payment_history_score'] = self._analyze_payment_history(context)
         
         # Análisis del mercado
-        analysis['market_conditions'] = await self._analyze_market_conditions()
+        analysis['market_conditions'] = self._analyze_market_conditions(now)
         
         # Análisis temporal
-        analysis['time_factors'] = await self._analyze_time_factors()
+        analysis['time_factors'] = self._analyze_time_factors(now)
         
         return analysis
     
-    async def _analyze_business_health(self, context) -> float:
+    def _analyze_business_health(self, context) -> float:
         """Analiza la salud del negocio"""
         # Factores: flujo de caja, ventas recientes, edad del negocio
         cash_flow_score = context.get('recent_cash_flow', 0) / 100000  # Normalizado
         sales_trend = context.get('sales_trend', 'stable')
         business_age = context.get('business_age_months', 0)
         
-        score = 0.3  # Base
-        score += min(cash_flow_score, 0.4)  # Máximo 0.4
-        score += 0.2 if sales_trend == 'growing' else 0.1 if sales_trend == 'stable' else 0
-        score += min(business_age / 24, 0.1)  # Máximo 0.1 (2 años)
-        
-        return min(score, 1.0)
+        return business_health(cash_flow_score, SALES_TREND_CODES.get(sales_trend, 0), business_age)
     
-    async def _analyze_customer_tier(self, context) -> str:
+    def _analyze_customer_tier(self, context) -> str:
         """Determina el tier del cliente"""
         total_transactions = context.get('total_transactions', 0)
         total_volume = context.get('total_volume', 0)
         days_as_customer = context.get('customer_age_days', 0)
         
-        if total_volume > 500000 and total_transactions > 50:  # 500k+ MXN, 50+ transacciones
-            return 'platinum'
-        elif total_volume > 100000 and total_transactions > 20:  # 100k+ MXN, 20+ transacciones  
-            return 'gold'
-        elif total_volume > 20000 and total_transactions > 5:   # 20k+ MXN, 5+ transacciones
-            return 'silver'
-        elif days_as_customer > 30:
-            return 'bronze'
-        else:
-            return 'new'
+        # Tier máximo por volumen; baja mientras no alcancen las transacciones
+        tier = bisect_left(TIER_VOLUME_BREAKS, total_volume)
+        while tier and total_transactions <= TIER_MIN_TRANSACTIONS[tier - 1]:
+            tier -= 1
+        
+        if tier:
+            return TIER_NAMES[tier - 1]
+        return 'bronze' if days_as_customer > 30 else 'new'
     
-    async def _analyze_payment_history(self, context) -> float:
+    def _analyze_payment_history(self, context) -> float:
         """Analiza el historial de pagos"""
         on_time_payments = context.get('on_time_payments', 0)
         total_payments = context.get('total_payments', 0)
@@ -326,25 +369,26 @@ class ContextAnalyzer:
             
         return min(on_time_payments / total_payments, 1.0)
     
-    async def _analyze_market_conditions(self) -> Dict[str, Any]:
+    def _analyze_market_conditions(self, now: datetime) -> Dict[str, Any]:
         """Analiza condiciones del mercado"""
-        current_hour = datetime.now().hour
+        current_hour = now.hour
+        day_of_week = now.weekday()
         
         return {
             'is_business_hours': 6 <= current_hour <= 22,
             'is_peak_hours': 9 <= current_hour <= 18,
-            'day_of_week': datetime.now().weekday(),
-            'is_weekend': datetime.now().weekday() >= 5
+            'day_of_week': day_of_week,
+            'is_weekend': day_of_week >= 5
         }
     
-    async def _analyze_time_factors(self) -> Dict[str, Any]:
+    def _analyze_time_factors(self, now: datetime) -> Dict[str, Any]:
         """Analiza factores temporales"""
-        now = datetime.now()
+        day = now.day
         
         return {
             'current_hour': now.hour,
-            'is_end_of_month': now.day >= 25,
-            'is_beginning_of_month': now.day <= 5,
+            'is_end_of_month': day >= 25,
+            'is_beginning_of_month': day <= 5,
             'quarter': (now.month - 1) // 3 + 1
         }
 
@@ -352,39 +396,34 @@ class ContextAnalyzer:
 class RiskCalculator:
     """Calculadora de riesgo inteligente"""
     
-    async def calculate_risk(self, data, context, verification_result) -> float:
+    def calculate_risk(self, data, context, verification_result, now: datetime) -> float:
         """Calcula score de riesgo (0.0 = sin riesgo, 1.0 = máximo riesgo)"""
         
-        risk_factors = []
-        
-        # Factor de verificación
+        # Factor de verificación (peso 0.3)
         verification_risk = 1.0 - verification_result.confidence
-        risk_factors.append(('verification', verification_risk, 0.3))
         
-        # Factor de monto
+        # Verificación prácticamente fallida: riesgo máximo sin evaluar el resto
+        if verification_risk >= 0.9:
+            return 1.0
+        
+        # Factor de monto (peso 0.25)
         amount = data.get('amount', 0)
         amount_risk = min(amount / 100000, 1.0)  # Normalizado a 100k
-        risk_factors.append(('amount', amount_risk, 0.25))
         
-        # Factor de cliente
+        # Factor de cliente (peso 0.2)
         customer_age = context.get('customer_age_days', 0)
-        customer_risk = max(0, (30 - customer_age) / 30)  # Más riesgo = más nuevo
-        risk_factors.append(('customer_age', customer_risk, 0.2))
+        customer_risk = max(0.0, (30 - customer_age) / 30)  # Más riesgo = más nuevo
         
-        # Factor de ubicación
-        location_risk = await self._calculate_location_risk(data, context)
-        risk_factors.append(('location', location_risk, 0.15))
+        # Factor de ubicación (peso 0.15)
+        location_risk = self._calculate_location_risk(data, context)
         
-        # Factor temporal
-        temporal_risk = await self._calculate_temporal_risk()
-        risk_factors.append(('temporal', temporal_risk, 0.1))
+        # Factor temporal (peso 0.1)
+        temporal_risk = self._calculate_temporal_risk(now)
         
         # Calcular riesgo ponderado
-        total_risk = sum(risk * weight for _, risk, weight in risk_factors)
-        
-        return min(total_risk, 1.0)
+        return weighted_risk(verification_risk, amount_risk, customer_risk, location_risk, temporal_risk)
     
-    async def _calculate_location_risk(self, data, context) -> float:
+    def _calculate_location_risk(self, data, context) -> float:
         """Calcula riesgo basado en ubicación"""
         # Implementar análisis geográfico real
         user_location = data.get('location', {})
@@ -395,9 +434,9 @@ class RiskCalculator:
             
         return 0.1  # Bajo riesgo en México
     
-    async def _calculate_temporal_risk(self) -> float:
+    def _calculate_temporal_risk(self, now: datetime) -> float:
         """Calcula riesgo temporal"""
-        current_hour = datetime.now().hour
+        current_hour = now.hour
         
         # Horarios fuera de lo normal = mayor riesgo
         if current_hour < 6 or current_hour > 22:
@@ -0,0 +1,46 @@
+"""
+Kernels numéricos del motor de decisiones
+Aritmética pura sobre escalares; se compila con Numba cuando está disponible
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback sin Numba: deja la función en Python puro"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+# Códigos de tendencia de ventas para business_health
+SALES_TREND_CODES = {'growing': 2, 'stable': 1}
+
+
+@njit(cache=True)
+def weighted_risk(verification_risk, amount_risk, customer_risk, location_risk, temporal_risk):
+    """Riesgo ponderado de los cinco factores, acotado a 1.0"""
+    total_risk = (
+        verification_risk * 0.3
+        + amount_risk * 0.25
+        + customer_risk * 0.2
+        + location_risk * 0.15
+        + temporal_risk * 0.1
+    )
+    return min(total_risk, 1.0)
+
+
+@njit(cache=True)
+def business_health(cash_flow_score, sales_trend_code, business_age_months):
+    """Score de salud del negocio (0.0 - 1.0)"""
+    score = 0.3  # Base
+    score += min(cash_flow_score, 0.4)  # Máximo 0.4
+    if sales_trend_code == 2:
+        score += 0.2
+    elif sales_trend_code == 1:
+        score += 0.1
+    score += min(business_age_months / 24, 0.1)  # Máximo 0.1 (2 años)
+
+    return min(score, 1.0)
@@ -4,12 +4,25 @@ Aprende de cada transacción, decisión y resultado para mejorar continuamente
 """
 
 import asyncio
+import itertools
+import math
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields, is_dataclass
 from enum import Enum
 import json
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from ..decisions import DecisionType
+
 class LearningEventType(Enum):
     DECISION_MADE = "decision_made"
     PAYMENT_COMPLETED = "payment_completed" 
@@ -17,7 +30,23 @@ class LearningEventType(Enum):
     CUSTOMER_FEEDBACK = "customer_feedback"
     BUSINESS_OUTCOME = "business_outcome"
 
-@dataclass
+# Tipo de decisión -> tipo de patrón (el resto cae en 'customer_behaviors')
+_PATTERN_BY_DECISION = {
+    DecisionType.APPROVE: 'successful_transactions',
+    DecisionType.REJECT: 'failed_transactions'
+}
+
+# (resultado esperado, resultado real) -> precisión de la predicción
+_ACCURACY_MAP = {
+    ('success', 'completed'): 1.0,
+    ('success', 'failed'): 0.0,
+    ('prevented_loss', 'fraud_confirmed'): 1.0,
+    ('prevented_loss', 'false_positive'): 0.0,
+    ('review_needed', 'manual_approved'): 0.8,
+    ('review_needed', 'manual_rejected'): 0.8
+}
+
+@dataclass(slots=True)
 class LearningEvent:
     event_type: LearningEventType
     timestamp: datetime
@@ -25,6 +54,50 @@ class LearningEvent:
     context: Dict[str, Any]
     outcome: Optional[Dict[str, Any]] = None
     labels: Optional[List[str]] = None
+    event_id: Optional[int] = None  # ID de decisión para learn_from_outcome
+
+def _json_default(obj):
+    """Tipos no nativos de JSON: mismo formato con y sin orjson"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if is_dataclass(obj):
+        # Sin asdict: evita la copia profunda de data/context
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    return str(obj)
+
+
+def _finite(obj):
+    """Copia con NaN/Infinity como None (JSON no los admite; orjson emite null)"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return _finite(_json_default(obj))
+    return obj
+
+
+def serialize_event(event: LearningEvent) -> bytes:
+    """Serializa un evento a JSON (bytes) para persistencia o colas
+    
+    Misma salida con y sin orjson: llaves no-str (int, float, bool, None)
+    como texto y NaN/Infinity como null.
+    """
+    if ORJSON_AVAILABLE:
+        # orjson recorre el dataclass directamente, sin asdict
+        return orjson.dumps(event, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    
+    dumps_options = {'default': _json_default, 'ensure_ascii': False, 'separators': (',', ':'), 'allow_nan': False}
+    try:
+        return json.dumps(event, **dumps_options).encode()
+    except ValueError:
+        # Hay NaN/Infinity: se reemplazan por null, como orjson
+        return json.dumps(_finite(event), **dumps_options).encode()
+
 
 class ContinuousLearningEngine:
     """Motor de aprendizaje continuo - Cerebro que evoluciona"""
@@ -35,25 +108,63 @@ class ContinuousLearningEngine:
         self.model_updater = ModelUpdater()
         self.feedback_processor = FeedbackProcessor()
         
-    async def record_interaction(self, request_data, decision, context):
-        """Registra cada interacción para aprendizaje"""
+        # Cola de eventos drenada en lotes fuera del camino crítico
+        self.drain_batch_size = 256
+        self.drain_wait = 0.01  # 10 ms
+        self._event_queue: Optional[asyncio.Queue] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        
+    async def record_interaction(self, request_data, decision, context) -> int:
+        """Registra cada interacción para aprendizaje
+        
+        La decisión queda pendiente de resultado antes de retornar, así que su ID
+        sirve de inmediato para learn_from_outcome. Patrones y estadísticas se
+        aprenden en lotes en segundo plano.
+        
+        Returns:
+            ID de la decisión, para reportar su resultado con learn_from_outcome
+        """
         
         event = LearningEvent(
             event_type=LearningEventType.DECISION_MADE,
             timestamp=datetime.now(),
             data=request_data,
             context=context,
-            outcome={"decision": asdict(decision)}
+            outcome={"decision": decision}  # Decision es inmutable: se comparte sin copiar
         )
-        
-        # Procesar en paralelo
-        await asyncio.gather(
-            self.pattern_learner.learn_from_event(event),
-            self.outcome_tracker.track_decision(event),
-            self._schedule_model_update(event)
+        self.outcome_tracker.register_decision(event)
+        
+        # El drenado vive en el event loop actual; se recrea si el loop cambió
+        # (una tarea de un loop ya cerrado puede seguir pendiente, no done)
+        if not self._drain_running():
+            self._event_queue = asyncio.Queue(maxsize=10_000)
+            self._drain_task = asyncio.get_running_loop().create_task(
+                self._drain_loop(self._event_queue)
+            )
+        
+        try:
+            self._event_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Contrapresión: sin perder eventos, procesar en línea
+            await self._process_events([event])
+        
+        return event.event_id
+    
+    async def flush(self):
+        """Espera a que se procesen todos los eventos encolados"""
+        if self._drain_running():
+            await self._event_queue.join()
+    
+    def _drain_running(self) -> bool:
+        """True si la tarea de drenado está viva en el event loop actual"""
+        task = self._drain_task
+        return (
+            task is not None
+            and not task.done()
+            and task.get_loop() is asyncio.get_running_loop()
         )
     
-    async def learn_from_outcome(self, original_event_id: str, actual_outcome: Dict[str, Any]):
+    async def learn_from_outcome(self, original_event_id: int, actual_outcome: Dict[str, Any]):
         """Aprende del resultado real vs predicción"""
         
         outcome_event = LearningEvent(
@@ -79,53 +190,195 @@ class ContinuousLearningEngine:
         
         await self.feedback_processor.process_feedback(feedback_event)
         
-    async def _schedule_model_update(self, event):
+    async def _drain_loop(self, queue: asyncio.Queue):
+        """Drena la cola en lotes de hasta drain_batch_size o cada drain_wait"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            events = [await queue.get()]
+            deadline = loop.time() + self.drain_wait
+            
+            while len(events) < self.drain_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    events.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._process_events(events)
+            except Exception as e:
+                print(f"[Learning] Error procesando lote de {len(events)} eventos: {e}")
+            finally:
+                for _ in events:
+                    queue.task_done()
+    
+    async def _process_events(self, events: List[LearningEvent]):
+        """Aprende de un lote de eventos de decisión"""
+        previous_count = self.pattern_learner.get_event_count()
+        
+        # Las decisiones ya quedaron pendientes en record_interaction
+        await self.pattern_learner.learn_from_events_batch(events)
+        
+        await self._schedule_model_update(events, previous_count)
+    
+    async def _schedule_model_update(self, events, previous_count):
         """Programa actualización de modelos"""
         # En producción, esto sería asíncrono con cola de trabajos
-        if self._should_trigger_model_update(event):
+        if self._should_trigger_model_update(events, previous_count):
             await self.model_updater.trigger_update()
     
-    def _should_trigger_model_update(self, event) -> bool:
+    def _should_trigger_model_update(self, events, previous_count) -> bool:
         """Determina si se debe actualizar el modelo"""
-        # Actualizar cada 1000 eventos o si hay fraude detectado
+        # Actualizar cada 1000 eventos (si el lote cruzó un múltiplo) o si hay fraude detectado
         return (
-            event.event_type == LearningEventType.FRAUD_DETECTED or
-            self.pattern_learner.get_event_count() % 1000 == 0
+            any(event.event_type == LearningEventType.FRAUD_DETECTED for event in events) or
+            self.pattern_learner.get_event_count() // 1000 > previous_count // 1000
         )
 
 
+# Nombre de VerificationLevel -> código de 4 bits (0 = desconocido)
+_VERIFICATION_LEVEL_CODES = {'BASIC': 1, 'ENHANCED': 2, 'DEEP': 3, 'CRITICAL': 4}
+
+
+def as_float(value: Any, default: float = 0.0) -> float:
+    """Convierte un campo de contexto a float; no numérico o no finito -> default"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if math.isfinite(value) else default
+
+
+def quantize(value: Any) -> int:
+    """Cuantiza un valor normalizado [0, 1] a uint8 con dos decimales"""
+    return min(max(int(round(as_float(value) * 100)), 0), 255)
+
+
+def dequantize(value: int) -> float:
+    return value / 100.0
+
+
+def pack_time_slot(hour: int, day_of_week: int, level_code: int) -> int:
+    """Empaca hora (5 bits), día de la semana (3 bits) y nivel de verificación (4 bits)"""
+    return hour | (day_of_week << 5) | (level_code << 8)
+
+
+def unpack_time_slot(slot: int):
+    """Inverso de pack_time_slot: (hora, día de la semana, código de nivel)"""
+    return slot & 0x1F, (slot >> 5) & 0x7, (slot >> 8) & 0xF
+
+
+class PatternStore:
+    """Almacén columnar (SoA) de patrones: un array compacto por feature numérica"""
+    
+    COLUMNS = (
+        ('timestamp', 'd'),                # Unix seconds, en orden de llegada
+        ('amount', 'f'),                   # float32: sin overflow ni problema de signo
+        ('time_slot', 'H'),                # Ver pack_time_slot
+        ('customer_age_days', 'd'),
+        ('previous_transactions', 'd'),
+        ('verification_confidence', 'B')   # Cuantizado x100, ver dequantize
+    )
+    
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity  # Máximo de patrones retenidos (los más recientes)
+        self.columns = {name: array(typecode) for name, typecode in self.COLUMNS}
+    
+    def __len__(self) -> int:
+        return len(self.columns['timestamp'])
+    
+    def append(self, timestamp: float, features: Dict[str, Any]):
+        """Agrega un patrón"""
+        self.extend([(timestamp, features)])
+    
+    def extend(self, rows: List[tuple]):
+        """Agrega un lote de (timestamp, features): una extensión en bloque por columna"""
+        # Se construyen todas las columnas antes de escribir: un error deja el store intacto.
+        # Los campos de contexto no se validan aguas arriba: se coercionan fila por fila.
+        values = {
+            'timestamp': [timestamp for timestamp, _ in rows],
+            'amount': [as_float(f.get('amount')) for _, f in rows],
+            'time_slot': [
+                pack_time_slot(
+                    f['hour_of_day'],  # Del timestamp del evento: siempre válidos
+                    f['day_of_week'],
+                    _VERIFICATION_LEVEL_CODES.get(f.get('verification_level'), 0)
+                )
+                for _, f in rows
+            ],
+            'customer_age_days': [as_float(f.get('customer_age_days')) for _, f in rows],
+            'previous_transactions': [as_float(f.get('previous_transactions')) for _, f in rows],
+            'verification_confidence': [quantize(f.get('verification_confidence', 0)) for _, f in rows]
+        }
+        for name, column in self.columns.items():
+            column.extend(values[name])
+        
+        # Recorte con holgura de 1/8 para amortizar el costo del slice
+        overflow = len(self) - self.capacity
+        if overflow > self.capacity // 8:
+            self._drop_oldest(overflow)
+    
+    def drop_before(self, cutoff_ts: float):
+        """Elimina patrones con timestamp <= cutoff (búsqueda binaria + slice)"""
+        self._drop_oldest(bisect_right(self.columns['timestamp'], cutoff_ts))
+    
+    def _drop_oldest(self, count: int):
+        if count:
+            for column in self.columns.values():
+                del column[:count]
+
+
 class PatternLearner:
     """Aprende patrones de comportamiento y fraude"""
     
     def __init__(self):
         self.event_count = 0
+        self.cleanup_every = 10_000  # Eventos entre limpiezas por antigüedad
+        self._last_cleanup_at_count = 0
         self.patterns = {
-            'successful_transactions': [],
-            'failed_transactions': [],
-            'fraud_attempts': [],
-            'customer_behaviors': []
+            'successful_transactions': PatternStore(),
+            'failed_transactions': PatternStore(),
+            'fraud_attempts': PatternStore(),
+            'customer_behaviors': PatternStore()
         }
     
     async def learn_from_event(self, event: LearningEvent):
         """Aprende patrones de cada evento"""
-        self.event_count += 1
-        
-        # Extraer características clave
-        features = self._extract_features(event)
-        
-        # Clasificar el patrón
-        pattern_type = self._classify_pattern(event, features)
-        
-        # Almacenar para aprendizaje
-        if pattern_type in self.patterns:
-            self.patterns[pattern_type].append({
-                'timestamp': event.timestamp,
-                'features': features,
-                'outcome': event.outcome
-            })
+        await self.learn_from_events_batch([event])
+    
+    async def learn_from_events_batch(self, events: List[LearningEvent]):
+        """Aprende patrones de un lote de eventos"""
+        # Filas agrupadas por tipo de patrón para escribir cada store en bloque
+        rows_by_pattern = {pattern_type: [] for pattern_type in self.patterns}
+        
+        for event in events:
+            try:
+                # Extraer características clave
+                features = self._extract_features(event)
+                
+                # Clasificar el patrón
+                pattern_type = self._classify_pattern(event, features)
+            except Exception as e:
+                # Un evento malformado no descarta el resto del lote
+                print(f"[Learning] Evento omitido: {e}")
+                continue
             
-        # Limpiar patrones antiguos
-        await self._cleanup_old_patterns()
+            # Almacenar para aprendizaje
+            if pattern_type in rows_by_pattern:
+                rows_by_pattern[pattern_type].append((event.timestamp.timestamp(), features))
+        
+        self.event_count += len(events)
+        for pattern_type, rows in rows_by_pattern.items():
+            if rows:
+                self.patterns[pattern_type].extend(rows)
+            
+        # Limpiar patrones antiguos (periódicamente; la capacidad ya acota memoria)
+        if self.event_count - self._last_cleanup_at_count >= self.cleanup_every:
+            self._last_cleanup_at_count = self.event_count
+            await self._cleanup_old_patterns()
     
     def _extract_features(self, event: LearningEvent) -> Dict[str, Any]:
         """Extrae características clave del evento"""
@@ -146,7 +399,7 @@ class PatternLearner:
             features.update({
                 'verification_confidence': getattr(vr, 'confidence', 0),
                 'verification_flags_count': len(getattr(vr, 'flags', [])),
-                'verification_level': str(getattr(vr, 'level', 'unknown'))
+                'verification_level': getattr(getattr(vr, 'level', None), 'name', 'unknown')
             })
         
         return features
@@ -156,23 +409,16 @@ class PatternLearner:
         
         if event.event_type == LearningEventType.FRAUD_DETECTED:
             return 'fraud_attempts'
-            
-        if event.outcome and event.outcome.get('decision', {}).get('type') == 'approve':
-            return 'successful_transactions'
-        elif event.outcome and event.outcome.get('decision', {}).get('type') == 'reject':
-            return 'failed_transactions'
-        else:
-            return 'customer_behaviors'
+        
+        decision_type = getattr((event.outcome or {}).get('decision'), 'type', None)
+        return _PATTERN_BY_DECISION.get(decision_type, 'customer_behaviors')
     
     async def _cleanup_old_patterns(self):
         """Limpia patrones antiguos para evitar acumulación"""
-        cutoff_date = datetime.now() - timedelta(days=90)  # 90 días
+        cutoff_ts = (datetime.now() - timedelta(days=90)).timestamp()  # 90 días
         
-        for pattern_type in self.patterns:
-            self.patterns[pattern_type] = [
-                p for p in self.patterns[pattern_type] 
-                if p['timestamp'] > cutoff_date
-            ]
+        for store in self.patterns.values():
+            store.drop_before(cutoff_ts)
     
     def get_event_count(self) -> int:
         return self.event_count
@@ -181,23 +427,51 @@ class PatternLearner:
 class OutcomeTracker:
     """Rastrea resultados reales vs predicciones"""
     
-    def __init__(self):
-        self.pending_outcomes = {}  # Decisiones esperando resultado
-        self.completed_outcomes = []  # Resultados confirmados
+    def __init__(self, max_pending: int = 100_000):
+        # Decisiones esperando resultado, por ID entero (en orden de llegada).
+        # Acotado: las más antiguas sin resultado reportado se descartan.
+        self.max_pending = max_pending
+        self.pending_outcomes = OrderedDict()
+        self.completed_outcomes = deque(maxlen=100_000)  # Resultados confirmados (recientes)
+        self._next_id = itertools.count()
+    
+    def next_decision_id(self) -> int:
+        """Reserva un ID secuencial de decisión"""
+        return next(self._next_id)
         
-    async def track_decision(self, event: LearningEvent):
-        """Rastrea una decisión para verificar resultado futuro"""
+    async def track_decision(self, event: LearningEvent) -> Optional[int]:
+        """Rastrea una decisión para verificar resultado futuro
+        
+        Returns:
+            ID de la decisión, para reportar su resultado después
+        """
+        return self.register_decision(event)
+    
+    def register_decision(self, event: LearningEvent) -> Optional[int]:
+        """Deja la decisión pendiente de resultado (síncrono, sin esperar al drenado)
+        
+        Asigna event.event_id si el evento no trae uno.
+        """
         
         if event.event_type == LearningEventType.DECISION_MADE:
-            decision_id = f"{event.timestamp.isoformat()}_{hash(str(event.data))}"
+            decision_id = event.event_id
+            if decision_id is None:
+                decision_id = event.event_id = self.next_decision_id()
             
-            self.pending_outcomes[decision_id] = {
+            pending = self.pending_outcomes
+            pending[decision_id] = {
                 'decision': event.outcome.get('decision'),
                 'timestamp': event.timestamp,
                 'data': event.data,
                 'context': event.context,
                 'expected_outcome': self._predict_outcome(event)
             }
+            if len(pending) > self.max_pending:
+                pending.popitem(last=False)
+            
+            return decision_id
+        
+        return None
     
     async def record_outcome(self, outcome_event: LearningEvent):
         """Registra el resultado real"""
@@ -216,31 +490,23 @@ class OutcomeTracker:
     
     def _predict_outcome(self, event: LearningEvent) -> Dict[str, Any]:
         """Predice el resultado esperado"""
-        decision = event.outcome.get('decision', {})
-        
-        if decision.get('type') == 'approve':
-            return {'expected': 'success', 'confidence': decision.get('confidence', 0.5)}
-        elif decision.get('type') == 'reject':
-            return {'expected': 'prevented_loss', 'confidence': decision.get('confidence', 0.5)}
+        decision = event.outcome.get('decision')
+        decision_type = getattr(decision, 'type', None)
+        confidence = getattr(decision, 'confidence', 0.5)
+        
+        if decision_type is DecisionType.APPROVE:
+            return {'expected': 'success', 'confidence': confidence}
+        elif decision_type is DecisionType.REJECT:
+            return {'expected': 'prevented_loss', 'confidence': confidence}
         else:
-            return {'expected': 'review_needed', 'confidence': decision.get('confidence', 0.5)}
+            return {'expected': 'review_needed', 'confidence': confidence}
     
     def _calculate_accuracy(self, original, actual_outcome) -> float:
         """Calcula precisión de la predicción"""
         expected = original['expected_outcome']['expected']
         actual = actual_outcome.get('result', 'unknown')
         
-        # Mapeo simple de resultados
-        accuracy_map = {
-            ('success', 'completed'): 1.0,
-            ('success', 'failed'): 0.0,
-            ('prevented_loss', 'fraud_confirmed'): 1.0,
-            ('prevented_loss', 'false_positive'): 0.0,
-            ('review_needed', 'manual_approved'): 0.8,
-            ('review_needed', 'manual_rejected'): 0.8
-        }
-        
-        return accuracy_map.get((expected, actual), 0.5)
+        return _ACCURACY_MAP.get((expected, actual), 0.5)
 
 
 class ModelUpdater:
@@ -4,18 +4,48 @@ Verifica CADA transacción, mensaje, decisión en tiempo real
 """
 
 import asyncio
+import re
+import string
+from collections import namedtuple
+from operator import eq, gt, lt
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Patrón compilado una sola vez al cargar el módulo
+# +52 1 (área) numero o +52 (área) numero
+_PHONE_RE = re.compile(r'\+52[1-9][0-9]{9,10}')
+# Caracteres permitidos en email: usuario@dominio.tld (TLD de 2+ letras)
+_EMAIL_USER_CHARS = frozenset(string.ascii_letters + string.digits + '._%+-')
+_EMAIL_DOMAIN_CHARS = frozenset(string.ascii_letters + string.digits + '.-')
+_EMAIL_TLD_CHARS = frozenset(string.ascii_letters)
+
+# Resultado de cada verificación: esquema fijo, sin un dict por check
+CheckOut = namedtuple('CheckOut', 'valid flags confidence kind has_missing', defaults=(False,))
+
+# Flag -> razón human-readable, en orden de prioridad
+_REASON_PRIORITY = (
+    ('known_fraud_pattern', "Patrón de fraude detectado"),
+    ('exceeds_daily_limit', "Excede límite diario permitido"),
+)
+# Separadores permitidos al capturar teléfonos
+_PHONE_STRIP = str.maketrans('', '', ' -')
+
 class VerificationLevel(Enum):
+    # Miembros singleton: comparar con `is`, no con ==
     BASIC = "basic"           # Verificación básica
     ENHANCED = "enhanced"     # Verificación con ML
     DEEP = "deep"            # Verificación profunda con IA
     CRITICAL = "critical"    # Máxima verificación para transacciones grandes
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VerificationResult:
     is_valid: bool
     confidence: float  # 0.0 - 1.0
@@ -27,45 +57,140 @@ class VerificationResult:
 class AIVerificationEngine:
     """Motor de verificación con IA - CORE de seguridad"""
     
-    def __init__(self):
+    # (clave de contexto, default, comparación, umbral, nivel) en orden de prioridad
+    _LEVEL_RULES = (
+        # Transacciones de alto valor = verificación crítica
+        ('transaction_amount', 0, gt, 50000, VerificationLevel.CRITICAL),  # +50k MXN
+        # WhatsApp commerce = verificación enhanced
+        ('channel', None, eq, 'whatsapp', VerificationLevel.ENHANCED),
+        # Nuevos clientes = verificación deep
+        ('customer_age_days', float('inf'), lt, 30, VerificationLevel.DEEP),
+    )
+    
+    def __init__(self, ml_backend=None, ml_max_concurrency: int = 20):
         self.risk_models = {}
         self.pattern_detection = PatternDetector()
         self.anomaly_detector = AnomalyDetector()
         
+        # Servidor de modelos ML (opcional): async score(data, context) -> CheckOut
+        # El semáforo acota las llamadas concurrentes para no saturarlo
+        self.ml_backend = ml_backend
+        self._ml_sem = asyncio.Semaphore(ml_max_concurrency)
+        
     async def verify_input(self, data: Dict[Any, Any], context: Dict[str, Any]) -> VerificationResult:
         """Verificación multicapa de entrada"""
         
+        # Hora de referencia una sola vez por request. Los lotes históricos pueden
+        # traerla en el contexto; se lee pero nunca se escribe en el dict del caller.
+        current_hour = context.get('_current_hour')
+        if current_hour is None:  # La hora 0 (medianoche) es válida
+            current_hour = datetime.now().hour
+        
         # Determinar nivel de verificación requerido
         verification_level = self._determine_verification_level(data, context)
         
-        # Ejecutar verificaciones en paralelo
-        checks = await asyncio.gather(
-            self._verify_data_integrity(data),
-            self._verify_business_rules(data, context),
-            self._verify_ml_patterns(data, context),
-            self._verify_anomalies(data, context)
-        )
+        # Verificaciones puramente de CPU: se ejecutan en secuencia, sin tasks
+        integrity = self._verify_data_integrity(data)
+        
+        # CRITICAL exige confianza >= 0.99 en cada check: el primero que baje decide el rechazo
+        critical = verification_level is VerificationLevel.CRITICAL
+        
+        # Datos inválidos: rechazo inmediato salvo DEEP, que exige el análisis completo
+        if not integrity.valid and verification_level is not VerificationLevel.DEEP:
+            return self._consolidate_results([integrity], verification_level)
+        
+        business = self._verify_business_rules(data, context, current_hour)
+        checks = [integrity, business]
+        if critical and business.confidence < 0.99:
+            return self._consolidate_results(checks, verification_level)
+        
+        ml = await self._score_ml_patterns(data, context)
+        checks.append(ml)
+        if critical and ml.confidence < 0.99:
+            return self._consolidate_results(checks, verification_level)
+        
+        # Fraude ya detectado por ML: las anomalías no cambian el resultado
+        if ml.confidence >= 0.2:
+            checks.append(self._verify_anomalies(data, context))
         
         return self._consolidate_results(checks, verification_level)
     
-    def _determine_verification_level(self, data, context) -> VerificationLevel:
-        """Determina el nivel de verificación necesario"""
+    @classmethod
+    def verify_batch(cls, amounts, avg_amounts, hours, daily_limits, location_anomalies=None):
+        """Verificación vectorizada de lotes históricos (ej. barrido nocturno de fraude)
         
-        # Transacciones de alto valor = verificación crítica
-        if context.get('transaction_amount', 0) > 50000:  # +50k MXN
-            return VerificationLevel.CRITICAL
+        Recibe columnas paralelas y reproduce verify_input fila por fila para
+        transacciones sin teléfono/email y con el detector ML local:
+        - el monto de la fila es también transaction_amount, así que las filas
+          de más de 50k son CRITICAL: cortan antes de las anomalías (confianza
+          del check de negocio o 0.95 del ML) y nunca son válidas;
+        - location_anomalies (opcional) trae el resultado de
+          AnomalyDetector.is_location_anomaly por fila.
+        Devuelve (válidos, confianza) por fila.
+        """
+        critical_amount = cls._LEVEL_RULES[0][3]
+        
+        if NUMPY_AVAILABLE:
+            amounts = np.asarray(amounts, dtype=np.float64)
+            avg_amounts = np.asarray(avg_amounts, dtype=np.float64)
+            hours = np.asarray(hours)
+            daily_limits = np.asarray(daily_limits, dtype=np.float64)
+            if location_anomalies is None:
+                mask_location = np.zeros(amounts.shape, dtype=bool)
+            else:
+                mask_location = np.asarray(location_anomalies, dtype=bool)
             
-        # WhatsApp commerce = verificación enhanced
-        if context.get('channel') == 'whatsapp':
-            return VerificationLevel.ENHANCED
+            mask_critical = amounts > critical_amount
+            mask_limit = amounts > daily_limits
+            mask_hours = (hours < 6) | (hours > 22)
+            mask_amount = amounts > avg_amounts * 10
             
-        # Nuevos clientes = verificación deep
-        if context.get('customer_age_days', float('inf')) < 30:
-            return VerificationLevel.DEEP
+            business = np.where(mask_limit, 0.2, 1.0) * np.where(mask_hours, 0.8, 1.0)
+            anomalies = 0.9 * np.where(mask_amount, 0.7, 1.0) * np.where(mask_location, 0.8, 1.0)
+            confidence = np.where(
+                mask_critical,
+                np.minimum(business, 0.95),
+                np.minimum(np.minimum(business, anomalies), 0.95)
+            )
+            # CRITICAL exige confianza >= 0.99 y el ML local da a lo más 0.95
+            valid = ~(mask_critical | mask_limit | mask_hours | mask_amount | mask_location)
+            return valid, confidence
+        
+        # Sin NumPy: mismo cálculo fila por fila
+        if location_anomalies is None:
+            location_anomalies = [False] * len(amounts)
+        valid = []
+        confidence = []
+        for amount, avg_amount, hour, daily_limit, location_anomaly in zip(
+            amounts, avg_amounts, hours, daily_limits, location_anomalies
+        ):
+            over_limit = amount > daily_limit
+            off_hours = hour < 6 or hour > 22
+            
+            business = (0.2 if over_limit else 1.0) * (0.8 if off_hours else 1.0)
+            if amount > critical_amount:
+                valid.append(False)
+                confidence.append(min(business, 0.95))
+                continue
+            
+            anomalous = amount > avg_amount * 10
+            anomalies = 0.9 * (0.7 if anomalous else 1.0) * (0.8 if location_anomaly else 1.0)
+            valid.append(not (over_limit or off_hours or anomalous or location_anomaly))
+            confidence.append(min(business, anomalies, 0.95))
+        return valid, confidence
+    
+    def _determine_verification_level(self, data, context) -> VerificationLevel:
+        """Determina el nivel de verificación necesario"""
+        context_get = context.get
+        
+        # Primera regla que se cumple gana
+        for key, default, compare, threshold, level in self._LEVEL_RULES:
+            if compare(context_get(key, default), threshold):
+                return level
             
         return VerificationLevel.BASIC
     
-    async def _verify_data_integrity(self, data) -> Dict:
+    def _verify_data_integrity(self, data) -> CheckOut:
         """Verifica integridad de datos"""
         flags = []
         
@@ -74,6 +199,7 @@ class AIVerificationEngine:
         for field in required_fields:
             if field not in data:
                 flags.append(f"missing_required_field_{field}")
+        has_missing = len(flags) > 0
         
         # Formato de datos
         if 'phone' in data and not self._is_valid_mexican_phone(data['phone']):
@@ -82,134 +208,147 @@ class AIVerificationEngine:
         if 'email' in data and not self._is_valid_email(data['email']):
             flags.append("invalid_email_format")
             
-        return {
-            "type": "integrity",
-            "valid": len(flags) == 0,
-            "flags": flags,
-            "confidence": 1.0 if len(flags) == 0 else 0.0
-        }
+        return CheckOut(len(flags) == 0, tuple(flags), 1.0 if len(flags) == 0 else 0.0, 'integrity', has_missing)
     
-    async def _verify_business_rules(self, data, context) -> Dict:
+    def _verify_business_rules(self, data, context, current_hour: int) -> CheckOut:
         """Verifica reglas de negocio"""
+        context_get = context.get
         flags = []
         confidence = 1.0
         
         # Límites de transacción
         amount = data.get('amount', 0)
-        if amount > context.get('daily_limit', 100000):  # 100k MXN diario
+        if amount > context_get('daily_limit', 100000):  # 100k MXN diario
             flags.append("exceeds_daily_limit")
             confidence = 0.2
             
         # Horarios permitidos
-        current_hour = datetime.now().hour
         if current_hour < 6 or current_hour > 22:  # 6 AM - 10 PM
             flags.append("outside_business_hours")
             confidence *= 0.8
             
-        return {
-            "type": "business_rules",
-            "valid": len(flags) == 0,
-            "flags": flags,
-            "confidence": confidence
-        }
+        return CheckOut(len(flags) == 0, tuple(flags), confidence, 'business_rules')
+    
+    async def _score_ml_patterns(self, data, context) -> CheckOut:
+        """Patrones ML: servidor de modelos con concurrencia acotada, o detector local"""
+        if self.ml_backend is None:
+            # Detector local: CPU trivial, se ejecuta inline
+            return self._verify_ml_patterns(data, context)
+        
+        async with self._ml_sem:
+            return await self.ml_backend.score(data, context)
     
-    async def _verify_ml_patterns(self, data, context) -> Dict:
+    def _verify_ml_patterns(self, data, context) -> CheckOut:
         """Verificación con ML patterns"""
         # Aquí iría la integración con modelos ML reales
         # Por ahora, simulamos detección de patrones
         
+        detector = self.pattern_detection
         suspicious_patterns = []
         confidence = 0.95
         
         # Detectar patrones de fraude conocidos
-        if self.pattern_detection.detect_fraud_pattern(data, context):
+        if detector.detect_fraud_pattern(data, context):
             suspicious_patterns.append("known_fraud_pattern")
             confidence = 0.1
             
         # Detectar comportamiento inusual
-        if self.pattern_detection.detect_unusual_behavior(data, context):
+        if detector.detect_unusual_behavior(data, context):
             suspicious_patterns.append("unusual_behavior")
             confidence *= 0.6
             
-        return {
-            "type": "ml_patterns",
-            "valid": len(suspicious_patterns) == 0,
-            "flags": suspicious_patterns,
-            "confidence": confidence
-        }
+        return CheckOut(len(suspicious_patterns) == 0, tuple(suspicious_patterns), confidence, 'ml_patterns')
     
-    async def _verify_anomalies(self, data, context) -> Dict:
+    def _verify_anomalies(self, data, context) -> CheckOut:
         """Detección de anomalías"""
+        data_get = data.get
+        detector = self.anomaly_detector
         anomalies = []
         confidence = 0.9
         
         # Detectar anomalías en el monto
-        if self.anomaly_detector.is_amount_anomaly(data.get('amount', 0), context):
+        if detector.is_amount_anomaly(data_get('amount', 0), context):
             anomalies.append("amount_anomaly")
             confidence *= 0.7
             
         # Detectar anomalías de ubicación
-        if self.anomaly_detector.is_location_anomaly(data.get('location'), context):
+        if detector.is_location_anomaly(data_get('location'), context):
             anomalies.append("location_anomaly")
             confidence *= 0.8
             
-        return {
-            "type": "anomalies",
-            "valid": len(anomalies) == 0,
-            "flags": anomalies,
-            "confidence": confidence
-        }
+        return CheckOut(len(anomalies) == 0, tuple(anomalies), confidence, 'anomalies')
     
     def _consolidate_results(self, checks, level) -> VerificationResult:
         """Consolida todos los resultados de verificación"""
-        all_flags = []
-        min_confidence = 1.0
-        is_valid = True
-        
-        for check in checks:
-            if not check['valid']:
-                is_valid = False
-            all_flags.extend(check['flags'])
-            min_confidence = min(min_confidence, check['confidence'])
+        if len(checks) == 4:
+            # Camino completo (sin short-circuit): comparaciones desenrolladas
+            c0, c1, c2, c3 = checks
+            is_valid = c0.valid and c1.valid and c2.valid and c3.valid
+            min_confidence = min(c0.confidence, c1.confidence, c2.confidence, c3.confidence)
+            has_missing = c0.has_missing  # Sólo integridad lo reporta
+            all_flags = [*c0.flags, *c1.flags, *c2.flags, *c3.flags]
+        else:
+            all_flags = []
+            extend_flags = all_flags.extend
+            min_confidence = 1.0
+            is_valid = True
+            has_missing = False
+            
+            for check in checks:
+                if not check.valid:
+                    is_valid = False
+                if check.has_missing:
+                    has_missing = True
+                flags = check.flags
+                if flags:  # La mayoría de los checks no genera flags
+                    extend_flags(flags)
+                confidence = check.confidence
+                if confidence < min_confidence:
+                    min_confidence = confidence
             
         # Ajustar confianza según el nivel
-        if level == VerificationLevel.CRITICAL and min_confidence < 0.99:
+        if level is VerificationLevel.CRITICAL and min_confidence < 0.99:
             is_valid = False
             
         return VerificationResult(
             is_valid=is_valid,
             confidence=min_confidence,
             level=level,
-            reason=self._generate_reason(all_flags, is_valid),
+            reason=self._generate_reason(all_flags, is_valid, has_missing),
             flags=all_flags
         )
     
-    def _generate_reason(self, flags, is_valid):
+    def _generate_reason(self, flags, is_valid, has_missing=False):
         """Genera razón human-readable"""
         if is_valid:
             return "Verificación exitosa"
             
-        if 'known_fraud_pattern' in flags:
-            return "Patrón de fraude detectado"
-        if 'exceeds_daily_limit' in flags:
-            return "Excede límite diario permitido"
-        if 'missing_required_field' in ' '.join(flags):
+        flag_set = set(flags)
+        for flag, reason in _REASON_PRIORITY:
+            if flag in flag_set:
+                return reason
+        if has_missing:
             return "Faltan campos requeridos"
             
         return f"Verificación falló: {len(flags)} problemas detectados"
     
     def _is_valid_mexican_phone(self, phone):
         """Valida teléfono mexicano"""
-        import re
-        # +52 1 (área) numero o +52 (área) numero
-        pattern = r'^\+52[1-9][0-9]{9,10}$'
-        return bool(re.match(pattern, str(phone).replace(' ', '').replace('-', '')))
+        return _PHONE_RE.fullmatch(str(phone).translate(_PHONE_STRIP)) is not None
     
     def _is_valid_email(self, email):
         """Valida email"""
-        import re
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, str(email)))
+        # Escaneo por conjuntos de caracteres, sin backtracking del motor de regex
+        user, at, domain = str(email).partition('@')
+        if not user or not at:
+            return False
+        host, _, tld = domain.rpartition('.')
+        return (
+            bool(host) and len(tld) >= 2
+            and _EMAIL_USER_CHARS.issuperset(user)
+            and _EMAIL_DOMAIN_CHARS.issuperset(host)
+            and _EMAIL_TLD_CHARS.issuperset(tld)
+        )
 
 
 class PatternDetector:
@@ -3,30 +3,66 @@ Business Flows - Flujos de negocio inteligentes
 Orquesta los flujos críticos del negocio con IA integrada
 """
 
-from .cash_flow import CashFlowManager
-from .collections import IntelligentCollections
-from .sales import AutonomousSales
+import importlib
+from functools import lru_cache
 
 __all__ = ['CashFlowManager', 'IntelligentCollections', 'AutonomousSales']
 
+# Los flujos se importan bajo demanda: un worker que sólo usa uno no carga los demás
+_LAZY_IMPORTS = {
+    'CashFlowManager': '.cash_flow',
+    'IntelligentCollections': '.collections',
+    'AutonomousSales': '.sales',
+}
+
+def __getattr__(name):
+    """Importación diferida de los flujos (PEP 562)"""
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # Siguientes accesos no pasan por __getattr__
+    return value
+
+# Prefijo de request_type -> flujo, en orden de prioridad
+_ROUTE_PREFIXES = (
+    ('cash_flow', 'cash_flow'),
+    ('collection', 'collections'),
+    ('sales', 'sales'),
+)
+
+@lru_cache(maxsize=256)
+def _resolve_flow(request_type: str):
+    """Flujo que atiende un request_type (None = flujo genérico)"""
+    for prefix, flow in _ROUTE_PREFIXES:
+        if request_type.startswith(prefix):
+            return flow
+    return None
+
 class BusinessFlowOrchestrator:
     """Orquestador principal de flujos de negocio"""
     
     def __init__(self, core_engine):
+        from .cash_flow import CashFlowManager
+        from .collections import IntelligentCollections
+        from .sales import AutonomousSales
+        
         self.core = core_engine
         self.cash_flow = CashFlowManager(core_engine)
         self.collections = IntelligentCollections(core_engine)
         self.sales = AutonomousSales(core_engine)
+        self._routes = {
+            'cash_flow': self.cash_flow.handle_request,
+            'collections': self.collections.handle_request,
+            'sales': self.sales.handle_request
+        }
         
     async def route_request(self, request_type: str, data: dict, context: dict):
         """Rutea requests a los flujos apropiados"""
-        
-        if request_type.startswith('cash_flow'):
-            return await self.cash_flow.handle_request(data, context)
-        elif request_type.startswith('collection'):
-            return await self.collections.handle_request(data, context)  
-        elif request_type.startswith('sales'):
-            return await self.sales.handle_request(data, context)
-        else:
-            # Flujo genérico con verificación IA
-            return await self.core.process_request(data, context)
\ No newline at end of file
+        # Los tipos de request son un conjunto pequeño: la resolución por prefijo se cachea
+        handler = self._routes.get(_resolve_flow(request_type))
+        if handler is not None:
+            return await handler(data, context)
+            
+        # Flujo genérico con verificación IA
+        return await self.core.process_request(data, context)
\ No newline at end of file
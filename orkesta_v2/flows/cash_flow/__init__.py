@@ -4,10 +4,75 @@ PROBLEMA CRÍTICO #1 en LATAM: Gestión de efectivo en tiempo real
 """
 
 import asyncio
+import copy
+import hashlib
+import json
+import math
+import secrets
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from enum import Enum
+from functools import cached_property
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from ._kernels import (
+    RISK_DECLINING_TREND, RISK_HIGH_DEBT, RISK_HIGH_VOLATILITY,
+    capacity_and_risks, signed_total
+)
+
+# Factor estacional típico retail por mes (índice 0 sin uso)
+_SEASONAL_FACTORS = (
+    1.0,
+    0.8,  # Enero - temporada baja
+    0.7,  # Febrero
+    0.9,  # Marzo
+    1.0,  # Abril - normal
+    1.1,  # Mayo
+    0.9,  # Junio
+    0.8,  # Julio
+    0.9,  # Agosto
+    1.1,  # Septiembre
+    1.2,  # Octubre
+    1.2,  # Noviembre
+    1.4,  # Diciembre - temporada alta
+)
+
+# Bit de la máscara de riesgo -> nombre reportado, en orden de reporte
+_RISK_FACTOR_NAMES = (
+    (RISK_HIGH_VOLATILITY, "high_cash_flow_volatility"),
+    (RISK_DECLINING_TREND, "declining_cash_flow_trend"),
+    (RISK_HIGH_DEBT, "high_debt_to_flow_ratio"),
+)
+
+# Plazo del adelanto por monto: hasta 10k -> 30 días, hasta 50k -> 60, resto -> 90
+_TERM_AMOUNT_LIMITS = (10000, 50000)
+_TERM_DAYS = (30, 60, 90)
+
+# Tiempo al desembolso por urgencia (default: 2 días laborales)
+_DISBURSEMENT_DELAYS = {
+    "critical": timedelta(hours=2),
+    "high": timedelta(hours=24)
+}
+_DEFAULT_DISBURSEMENT_DELAY = timedelta(days=2)
+
+# Signo de cada tipo de transacción en la posición teórica
+_TRANSACTION_SIGNS = {"inflow": 1, "outflow": -1}
 
 class CashFlowRequestType(Enum):
     ADVANCE_REQUEST = "advance_request"        # Solicitud de adelanto
@@ -15,7 +80,7 @@ class CashFlowRequestType(Enum):
     CASH_POSITION = "cash_position"           # Consulta de posición
     RECONCILIATION = "reconciliation"         # Conciliación
 
-@dataclass
+@dataclass(slots=True)
 class CashFlowRequest:
     request_type: CashFlowRequestType
     business_id: str
@@ -26,15 +91,118 @@ class CashFlowRequest:
     collateral: Optional[Dict] = None
     purpose: Optional[str] = None
 
+def _json_default(obj):
+    """Tipos no nativos de JSON: mismo formato con y sin orjson"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if NUMPY_AVAILABLE and isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return str(obj)
+
+
+def _finite(obj):
+    """Copia con NaN/Infinity como None (JSON no los admite; orjson emite null)"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if NUMPY_AVAILABLE and isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(obj.tolist())
+    return obj
+
+
+def serialize_response(response: Dict) -> bytes:
+    """Serializa la respuesta de un handler a JSON (bytes) para la capa de transporte
+    
+    Misma salida con y sin orjson: llaves no-str (int, float, bool, None)
+    como texto y NaN/Infinity como null.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            response,
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    
+    dumps_options = {'default': _json_default, 'ensure_ascii': False, 'separators': (',', ':'), 'allow_nan': False}
+    try:
+        return json.dumps(response, **dumps_options).encode()
+    except ValueError:
+        # Hay NaN/Infinity: se reemplazan por null, como orjson
+        return json.dumps(_finite(response), **dumps_options).encode()
+
+
+class _TTLCache:
+    """Cache en memoria con expiración por tiempo (monotonic), acotado en tamaño (LRU)
+    
+    Guarda y entrega copias profundas: los valores cacheados terminan en
+    respuestas que el caller puede mutar.
+    """
+    
+    def __init__(self, ttl: float, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key):
+        """Copia del valor vigente para key, o None si no existe o ya expiró"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return copy.deepcopy(value)
+    
+    def set(self, key, value):
+        """Guarda una copia de value; si está lleno descarta el menos usado"""
+        data = self._data
+        data[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
 class CashFlowManager:
     """Gestor inteligente de flujo de efectivo - CORE DE LATAM"""
     
     def __init__(self, core_engine):
         self.core = core_engine
-        self.cash_analyzer = CashFlowAnalyzer()
-        self.advance_processor = AdvanceProcessor()
-        self.reconciliation_engine = ReconciliationEngine()
         
+        # Tipo de request -> handler
+        self._handlers = {
+            CashFlowRequestType.ADVANCE_REQUEST: self._handle_advance_request,
+            CashFlowRequestType.PAYMENT_SCHEDULE: self._handle_payment_schedule,
+            CashFlowRequestType.CASH_POSITION: self._handle_cash_position,
+            CashFlowRequestType.RECONCILIATION: self._handle_reconciliation
+        }
+        
+    # Sub-motores creados bajo demanda: un worker que sólo atiende un tipo de request
+    # no construye los demás
+    
+    @cached_property
+    def cash_analyzer(self) -> "CashFlowAnalyzer":
+        """Analizador de flujo (lo usa el enriquecimiento de contexto de todo request)"""
+        return CashFlowAnalyzer()
+    
+    @cached_property
+    def advance_processor(self) -> "AdvanceProcessor":
+        """Procesador de adelantos"""
+        return AdvanceProcessor()
+    
+    @cached_property
+    def reconciliation_engine(self) -> "ReconciliationEngine":
+        """Motor de conciliación"""
+        return ReconciliationEngine()
+    
     async def handle_request(self, data: Dict[Any, Any], context: Dict[str, Any]):
         """Maneja todas las solicitudes de cash flow"""
         
@@ -56,14 +224,15 @@ class CashFlowManager:
             }
         
         # Procesar según tipo
-        if cash_request.request_type == CashFlowRequestType.ADVANCE_REQUEST:
-            return await self._handle_advance_request(cash_request, enhanced_context)
-        elif cash_request.request_type == CashFlowRequestType.PAYMENT_SCHEDULE:
-            return await self._handle_payment_schedule(cash_request, enhanced_context)
-        elif cash_request.request_type == CashFlowRequestType.CASH_POSITION:
-            return await self._handle_cash_position(cash_request, enhanced_context)
-        elif cash_request.request_type == CashFlowRequestType.RECONCILIATION:
-            return await self._handle_reconciliation(cash_request, enhanced_context)
+        handler = self._handlers.get(cash_request.request_type)
+        if handler is None:
+            return {
+                "status": "rejected",
+                "reason": f"Tipo de solicitud no soportado: {cash_request.request_type.value}",
+                "request_id": context.get("request_id")
+            }
+        
+        return await handler(cash_request, enhanced_context)
     
     async def _handle_advance_request(self, request: CashFlowRequest, context: Dict):
         """Maneja solicitudes de adelanto de efectivo"""
@@ -113,8 +282,8 @@ class CashFlowManager:
     async def _handle_payment_schedule(self, request: CashFlowRequest, context: Dict):
         """Maneja programación de pagos"""
         
-        # Analizar flujo de caja proyectado
-        cash_projection = await self.cash_analyzer.project_cash_flow(
+        # Analizar flujo de caja proyectado (en columnas)
+        cash_projection = await self.cash_analyzer.project_cash_flow_columns(
             request.business_id,
             days_ahead=30
         )
@@ -130,7 +299,7 @@ class CashFlowManager:
             "status": "scheduled",
             "payment_dates": optimal_dates,
             "total_amount": request.amount,
-            "projected_cash_impact": cash_projection,
+            "projected_cash_impact": self.cash_analyzer.projection_to_rows(cash_projection),
             "recommendations": await self._generate_payment_recommendations(request, context),
             "request_id": context.get("request_id")
         }
@@ -138,15 +307,23 @@ class CashFlowManager:
     async def _handle_cash_position(self, request: CashFlowRequest, context: Dict):
         """Consulta posición de efectivo en tiempo real"""
         
-        position = await self.cash_analyzer.get_current_position(request.business_id)
-        projections = await self.cash_analyzer.project_cash_flow(request.business_id, 7)
+        # Consultas independientes: se ejecutan concurrentemente
+        analyzer = self.cash_analyzer
+        position, projections = await asyncio.gather(
+            analyzer.get_current_position(request.business_id),
+            analyzer.project_cash_flow(request.business_id, 7)
+        )
+        
+        # Score y alertas reutilizan la posición ya consultada
+        liquidity_score = await analyzer.calculate_liquidity_score(request.business_id, position=position)
+        alerts = await analyzer.check_liquidity_alerts(request.business_id, position=position)
         
         return {
             "status": "success",
             "current_position": position,
             "weekly_projection": projections,
-            "liquidity_score": await self.cash_analyzer.calculate_liquidity_score(request.business_id),
-            "alerts": await self.cash_analyzer.check_liquidity_alerts(request.business_id),
+            "liquidity_score": liquidity_score,
+            "alerts": alerts,
             "request_id": context.get("request_id")
         }
     
@@ -171,16 +348,17 @@ class CashFlowManager:
         
         enhanced = context.copy()
         
-        # Datos financieros históricos
-        financial_data = await self.cash_analyzer.get_financial_history(request.business_id)
-        enhanced.update(financial_data)
+        # Historial financiero, score crediticio y estacionalidad son independientes:
+        # se consultan concurrentemente (latencia = la más lenta, no la suma)
+        analyzer = self.cash_analyzer
+        financial_data, credit_score, seasonality = await asyncio.gather(
+            analyzer.get_financial_history(request.business_id),
+            analyzer.calculate_credit_score(request.business_id),
+            analyzer.analyze_seasonality(request.business_id)
+        )
         
-        # Score de riesgo crediticio
-        credit_score = await self.cash_analyzer.calculate_credit_score(request.business_id)
+        enhanced.update(financial_data)
         enhanced["credit_score"] = credit_score
-        
-        # Análisis de estacionalidad
-        seasonality = await self.cash_analyzer.analyze_seasonality(request.business_id)
         enhanced["seasonality"] = seasonality
         
         return enhanced
@@ -251,22 +429,33 @@ class CashFlowManager:
 class CashFlowAnalyzer:
     """Analizador inteligente de flujo de efectivo"""
     
+    def __init__(self):
+        # Posición bancaria reutilizable por unos segundos entre consultas del mismo negocio
+        self._position_cache = _TTLCache(ttl=5.0)
+        # Datos de BD/buró: se reutilizan en ráfagas de requests del mismo negocio
+        self._history_cache = _TTLCache(ttl=300.0)         # 5 min
+        self._payment_history_cache = _TTLCache(ttl=300.0)  # 5 min
+        self._financial_health_cache = _TTLCache(ttl=60.0)  # 60 s (buró)
+    
+    async def _cached(self, cache: _TTLCache, business_id: str, fetch):
+        """Devuelve el valor vigente en cache o lo obtiene con fetch(business_id)"""
+        value = cache.get(business_id)
+        if value is None:
+            value = await fetch(business_id)
+            cache.set(business_id, value)
+        return value
+    
     async def analyze_payment_capacity(self, business_id: str, amount: float, context: Dict) -> Dict:
         """Analiza capacidad de pago con IA"""
         
         # Obtener datos históricos
         historical_data = await self._get_historical_cash_flow(business_id)
         
-        # Calcular métricas clave
-        avg_monthly_flow = sum(historical_data.get("monthly_flows", [])) / max(len(historical_data.get("monthly_flows", [1])), 1)
-        
-        debt_to_flow_ratio = context.get("current_debt", 0) / max(avg_monthly_flow, 1)
-        
-        capacity_score = self._calculate_capacity_score(
-            amount, 
-            avg_monthly_flow, 
-            debt_to_flow_ratio,
-            historical_data
+        # Métricas clave, score y factores de riesgo en un solo kernel numérico
+        avg_monthly_flow, debt_to_flow_ratio, capacity_score, risk_mask = capacity_and_risks(
+            array('d', historical_data.get("monthly_flows", [])),
+            float(amount),
+            float(context.get("current_debt", 0))
         )
         
         return {
@@ -274,61 +463,117 @@ class CashFlowAnalyzer:
             "avg_monthly_flow": avg_monthly_flow,
             "debt_to_flow_ratio": debt_to_flow_ratio,
             "recommended_max_advance": min(avg_monthly_flow * 0.3, 50000),  # 30% del flujo o 50k
-            "risk_factors": self._identify_risk_factors(historical_data, context)
+            "risk_factors": [name for bit, name in _RISK_FACTOR_NAMES if risk_mask & bit]
         }
     
     async def project_cash_flow(self, business_id: str, days_ahead: int) -> Dict:
         """Proyecta flujo de efectivo usando ML"""
         
+        columns = await self.project_cash_flow_columns(business_id, days_ahead)
+        return self.projection_to_rows(columns)
+    
+    async def project_cash_flow_columns(self, business_id: str, days_ahead: int) -> Dict:
+        """Proyección en columnas paralelas (una lista por campo, un elemento por día)"""
+        
         # En producción, usaría modelos ML reales
         # Por ahora, simulamos proyección
         
         base_flow = await self._get_current_flow_rate(business_id)
         seasonality_factor = await self._get_seasonality_factor(business_id)
         
-        projections = []
-        for day in range(1, days_ahead + 1):
-            date = datetime.now() + timedelta(days=day)
-            
-            # Simulación simple de proyección
-            daily_flow = base_flow * seasonality_factor * (0.9 + 0.2 * (day % 7) / 7)  # Variación semanal
-            
-            projections.append({
-                "date": date.isoformat(),
-                "projected_inflow": daily_flow * 1.1,
-                "projected_outflow": daily_flow * 0.9,
-                "net_flow": daily_flow * 0.2,
-                "confidence": 0.85 - (day * 0.01)  # Menos confianza a futuro
-            })
+        # Simulación simple de proyección: flujo diario con variación semanal,
+        # menos confianza a futuro
+        scale = base_flow * seasonality_factor
+        if NUMPY_AVAILABLE:
+            days = np.arange(1, days_ahead + 1)
+            daily = scale * (0.9 + 0.2 * (days % 7) / 7)
+            net = daily * 0.2
+            conf = 0.85 - days * 0.01
+            inflows, outflows = (daily * 1.1).tolist(), (daily * 0.9).tolist()
+            net_flows, confidences = net.tolist(), conf.tolist()
+            total_net_flow = float(net.sum())
+            confidence_avg = float(conf.mean())
+        else:
+            daily_flows = [scale * (0.9 + 0.2 * (day % 7) / 7) for day in range(1, days_ahead + 1)]
+            inflows = [daily_flow * 1.1 for daily_flow in daily_flows]
+            outflows = [daily_flow * 0.9 for daily_flow in daily_flows]
+            net_flows = [daily_flow * 0.2 for daily_flow in daily_flows]
+            confidences = [0.85 - (day * 0.01) for day in range(1, days_ahead + 1)]
+            total_net_flow = sum(net_flows)
+            confidence_avg = sum(confidences) / len(confidences)
+        
+        now = datetime.now()
+        return {
+            "dates": [(now + timedelta(days=day)).isoformat() for day in range(1, days_ahead + 1)],
+            "projected_inflow": inflows,
+            "projected_outflow": outflows,
+            "net_flow": net_flows,
+            "confidence": confidences,
+            "total_net_flow": total_net_flow,
+            "confidence_avg": confidence_avg
+        }
+    
+    @staticmethod
+    def projection_to_rows(columns: Dict) -> Dict:
+        """Convierte la proyección en columnas al formato de respuesta (una fila por día)"""
+        
+        projections = [
+            {
+                "date": date,
+                "projected_inflow": inflow,
+                "projected_outflow": outflow,
+                "net_flow": net_flow,
+                "confidence": confidence
+            }
+            for date, inflow, outflow, net_flow, confidence in zip(
+                columns["dates"],
+                columns["projected_inflow"],
+                columns["projected_outflow"],
+                columns["net_flow"],
+                columns["confidence"]
+            )
+        ]
         
         return {
             "projections": projections,
-            "total_net_flow": sum(p["net_flow"] for p in projections),
-            "confidence_avg": sum(p["confidence"] for p in projections) / len(projections)
+            "total_net_flow": columns["total_net_flow"],
+            "confidence_avg": columns["confidence_avg"]
         }
     
     async def optimize_payment_dates(self, amount: float, cash_projection: Dict, context: Dict) -> List[Dict]:
-        """Optimiza fechas de pago para maximizar flujo de caja"""
-        
-        projections = cash_projection.get("projections", [])
+        """Optimiza fechas de pago para maximizar flujo de caja
+        
+        cash_projection puede venir en filas (project_cash_flow) o en
+        columnas (project_cash_flow_columns).
+        """
+        
+        if "dates" in cash_projection:
+            days = zip(
+                cash_projection["dates"],
+                cash_projection["net_flow"],
+                cash_projection["confidence"]
+            )
+        else:
+            days = (
+                (projection["date"], projection["net_flow"], projection["confidence"])
+                for projection in cash_projection.get("projections", [])
+            )
         
         optimal_dates = []
         remaining_amount = amount
         
-        for projection in projections:
+        for date, available_cash, confidence in days:
             if remaining_amount <= 0:
                 break
-                
-            available_cash = projection["net_flow"]
             
             if available_cash > 0:
                 payment_amount = min(remaining_amount, available_cash * 0.8)  # 80% del flujo disponible
                 
                 if payment_amount > 100:  # Mínimo $100 MXN por pago
                     optimal_dates.append({
-                        "date": projection["date"],
+                        "date": date,
                         "amount": payment_amount,
-                        "confidence": projection["confidence"]
+                        "confidence": confidence
                     })
                     
                     remaining_amount -= payment_amount
@@ -336,7 +581,12 @@ class CashFlowAnalyzer:
         return optimal_dates
     
     async def get_current_position(self, business_id: str) -> Dict:
-        """Obtiene posición actual de efectivo"""
+        """Obtiene posición actual de efectivo (cacheada brevemente por negocio)"""
+        
+        return await self._cached(self._position_cache, business_id, self._fetch_current_position)
+    
+    async def _fetch_current_position(self, business_id: str) -> Dict:
+        """Consulta la posición de efectivo en las fuentes bancarias"""
         
         # En producción, conectaría con APIs bancarias reales
         return {
@@ -351,10 +601,11 @@ class CashFlowAnalyzer:
             "last_updated": datetime.now().isoformat()
         }
     
-    async def calculate_liquidity_score(self, business_id: str) -> float:
+    async def calculate_liquidity_score(self, business_id: str, position: Optional[Dict] = None) -> float:
         """Calcula score de liquidez (0.0 - 1.0)"""
         
-        position = await self.get_current_position(business_id)
+        if position is None:
+            position = await self.get_current_position(business_id)
         
         # Factores de liquidez
         cash_ratio = position["net_position"] / max(position["pending_payables"], 1)
@@ -364,12 +615,13 @@ class CashFlowAnalyzer:
         
         return liquidity_score
     
-    async def check_liquidity_alerts(self, business_id: str) -> List[Dict]:
+    async def check_liquidity_alerts(self, business_id: str, position: Optional[Dict] = None) -> List[Dict]:
         """Verifica alertas de liquidez"""
         
         alerts = []
-        position = await self.get_current_position(business_id)
-        liquidity_score = await self.calculate_liquidity_score(business_id)
+        if position is None:
+            position = await self.get_current_position(business_id)
+        liquidity_score = await self.calculate_liquidity_score(business_id, position=position)
         
         if liquidity_score < 0.3:
             alerts.append({
@@ -399,8 +651,10 @@ class CashFlowAnalyzer:
         # En producción, integraría con bureaus de crédito
         # Simulación basada en datos internos
         
-        payment_history = await self._get_payment_history(business_id)
-        financial_health = await self._assess_financial_health(business_id)
+        payment_history, financial_health = await asyncio.gather(
+            self._get_payment_history(business_id),
+            self._assess_financial_health(business_id)
+        )
         
         # Componentes del score
         payment_score = payment_history.get("on_time_percentage", 0.5)
@@ -419,22 +673,7 @@ class CashFlowAnalyzer:
         current_month = datetime.now().month
         
         # Simulación de estacionalidad típica retail
-        seasonal_patterns = {
-            12: 1.4,  # Diciembre - temporada alta
-            11: 1.2,  # Noviembre
-            1: 0.8,   # Enero - temporada baja
-            2: 0.7,   # Febrero
-            3: 0.9,   # Marzo
-            4: 1.0,   # Abril - normal
-            5: 1.1,   # Mayo
-            6: 0.9,   # Junio
-            7: 0.8,   # Julio
-            8: 0.9,   # Agosto
-            9: 1.1,   # Septiembre
-            10: 1.2   # Octubre
-        }
-        
-        current_factor = seasonal_patterns.get(current_month, 1.0)
+        current_factor = _SEASONAL_FACTORS[current_month]
         
         return {
             "current_period": "high_season" if current_factor > 1.2 else "low_season" if current_factor < 0.8 else "normal_season",
@@ -445,56 +684,12 @@ class CashFlowAnalyzer:
     
     # Métodos auxiliares privados
     
-    def _calculate_capacity_score(self, requested_amount, avg_monthly_flow, debt_ratio, historical_data):
-        """Calcula score de capacidad de pago"""
-        
-        # Ratio de cantidad solicitada vs flujo promedio
-        amount_ratio = requested_amount / max(avg_monthly_flow, 1)
-        
-        # Score base
-        if amount_ratio < 0.2:  # Menos del 20% del flujo mensual
-            amount_score = 1.0
-        elif amount_ratio < 0.5:  # Menos del 50%
-            amount_score = 0.8
-        elif amount_ratio < 1.0:  # Menos del 100%
-            amount_score = 0.6
-        else:
-            amount_score = 0.3
-        
-        # Penalizar por deuda existente
-        debt_penalty = max(0, debt_ratio - 0.5) * 0.5  # Penalizar si deuda > 50% del flujo
-        
-        final_score = max(0, amount_score - debt_penalty)
-        
-        return final_score
-    
-    def _identify_risk_factors(self, historical_data, context):
-        """Identifica factores de riesgo"""
-        
-        risk_factors = []
-        
-        # Volatilidad del flujo
-        flows = historical_data.get("monthly_flows", [])
-        if len(flows) > 1:
-            avg_flow = sum(flows) / len(flows)
-            volatility = sum(abs(f - avg_flow) for f in flows) / len(flows) / avg_flow
-            
-            if volatility > 0.3:  # 30% de volatilidad
-                risk_factors.append("high_cash_flow_volatility")
-        
-        # Tendencia negativa
-        if len(flows) >= 3 and flows[-1] < flows[-3] * 0.8:
-            risk_factors.append("declining_cash_flow_trend")
-        
-        # Deuda alta
-        debt_ratio = context.get("current_debt", 0) / max(sum(flows)/len(flows) if flows else 1, 1)
-        if debt_ratio > 0.8:
-            risk_factors.append("high_debt_to_flow_ratio")
-        
-        return risk_factors
-    
     async def _get_historical_cash_flow(self, business_id):
-        """Obtiene datos históricos de flujo de caja"""
+        """Obtiene datos históricos de flujo de caja (cacheados 5 min)"""
+        return await self._cached(self._history_cache, business_id, self._fetch_historical_cash_flow)
+    
+    async def _fetch_historical_cash_flow(self, business_id):
+        """Consulta datos históricos de flujo de caja"""
         # Simulación - en producción vendría de la base de datos
         return {
             "monthly_flows": [25000, 30000, 28000, 35000, 32000, 29000],
@@ -511,7 +706,11 @@ class CashFlowAnalyzer:
         return 1.0  # Factor neutral
     
     async def _get_payment_history(self, business_id):
-        """Obtiene historial de pagos"""
+        """Obtiene historial de pagos (cacheado 5 min)"""
+        return await self._cached(self._payment_history_cache, business_id, self._fetch_payment_history)
+    
+    async def _fetch_payment_history(self, business_id):
+        """Consulta historial de pagos"""
         return {
             "total_payments": 24,
             "on_time_payments": 22,
@@ -519,7 +718,11 @@ class CashFlowAnalyzer:
         }
     
     async def _assess_financial_health(self, business_id):
-        """Evalúa salud financiera"""
+        """Evalúa salud financiera (cacheada 60 s)"""
+        return await self._cached(self._financial_health_cache, business_id, self._fetch_financial_health)
+    
+    async def _fetch_financial_health(self, business_id):
+        """Consulta indicadores de salud financiera"""
         return {
             "stability_score": 0.85,
             "growth_score": 0.75
@@ -529,17 +732,25 @@ class CashFlowAnalyzer:
 class AdvanceProcessor:
     """Procesador de adelantos de efectivo"""
     
+    def __init__(self, stable_references: bool = False):
+        # Sufijo del número de referencia (12 hex): aleatorio, sin contador centralizado.
+        # Con stable_references los primeros 4 identifican al negocio entre workers.
+        self.stable_references = stable_references
+    
     async def process_advance(self, request: CashFlowRequest, context: Dict) -> Dict:
         """Procesa un adelanto aprobado"""
         
+        # Un solo timestamp para desembolso, calendario y referencia (consistentes para auditoría)
+        now = datetime.now()
+        
         # Generar términos del adelanto
         terms = self._generate_advance_terms(request, context)
         
         # Programar desembolso
-        disbursement_date = self._calculate_disbursement_date(request, context)
+        disbursement_date = self._calculate_disbursement_date(request, context, now)
         
         # Crear calendario de pagos
-        repayment_schedule = self._create_repayment_schedule(request, terms, context)
+        repayment_schedule = self._create_repayment_schedule(request, terms, context, now)
         
         # En producción, aquí se haría la transferencia real
         # Por ahora, solo simulamos
@@ -548,9 +759,18 @@ class AdvanceProcessor:
             "disbursement_date": disbursement_date.isoformat(),
             "repayment_schedule": repayment_schedule,
             "terms": terms,
-            "reference_number": f"ADV-{datetime.now().strftime('%Y%m%d')}-{hash(request.business_id) % 10000:04d}"
+            "reference_number": f"ADV-{now:%Y%m%d}-{self._reference_suffix(request.business_id)}"
         }
     
+    def _reference_suffix(self, business_id: str) -> str:
+        """Sufijo del número de referencia, único entre procesos y reinicios"""
+        if self.stable_references:
+            # BLAKE2b (stdlib): mismo prefijo en cualquier proceso, a diferencia de hash();
+            # 32 bits aleatorios distinguen los adelantos del mismo negocio
+            business_tag = hashlib.blake2b(business_id.encode(), digest_size=2).hexdigest()
+            return f"{business_tag}{secrets.token_hex(4)}".upper()
+        return secrets.token_hex(6).upper()  # 48 bits aleatorios
+    
     def _generate_advance_terms(self, request: CashFlowRequest, context: Dict) -> Dict:
         """Genera términos del adelanto"""
         
@@ -562,12 +782,7 @@ class AdvanceProcessor:
         annual_rate = base_rate + rate_adjustment
         
         # Plazo basado en monto
-        if request.amount <= 10000:
-            term_days = 30
-        elif request.amount <= 50000:
-            term_days = 60
-        else:
-            term_days = 90
+        term_days = _TERM_DAYS[bisect_left(_TERM_AMOUNT_LIMITS, request.amount)]
         
         return {
             "principal": request.amount,
@@ -580,17 +795,13 @@ class AdvanceProcessor:
             "total_cost": self._calculate_total_cost(request.amount, annual_rate, term_days)
         }
     
-    def _calculate_disbursement_date(self, request: CashFlowRequest, context: Dict) -> datetime:
+    def _calculate_disbursement_date(self, request: CashFlowRequest, context: Dict, now: datetime) -> datetime:
         """Calcula fecha de desembolso"""
         
-        if request.urgency == "critical":
-            return datetime.now() + timedelta(hours=2)  # 2 horas
-        elif request.urgency == "high":
-            return datetime.now() + timedelta(hours=24)  # 24 horas
-        else:
-            return datetime.now() + timedelta(days=2)  # 2 días laborales
+        delay = _DISBURSEMENT_DELAYS.get(request.urgency, _DEFAULT_DISBURSEMENT_DELAY)
+        return now + delay
     
-    def _create_repayment_schedule(self, request: CashFlowRequest, terms: Dict, context: Dict) -> List[Dict]:
+    def _create_repayment_schedule(self, request: CashFlowRequest, terms: Dict, context: Dict, now: datetime) -> List[Dict]:
         """Crea calendario de pagos"""
         
         principal = terms["principal"]
@@ -601,21 +812,22 @@ class AdvanceProcessor:
         num_payments = term_days // 7
         payment_amount = total_cost / num_payments
         
-        schedule = []
-        current_date = datetime.now() + timedelta(days=7)  # Primer pago en una semana
+        # Invariantes del calendario: iguales en todos los pagos
+        principal_portion = principal / num_payments
+        interest_portion = payment_amount - principal_portion
+        week = timedelta(days=7)
         
-        for i in range(num_payments):
-            schedule.append({
-                "payment_number": i + 1,
-                "due_date": current_date.isoformat(),
+        # Primer pago en una semana, luego semanal
+        return [
+            {
+                "payment_number": number,
+                "due_date": (now + week * number).isoformat(),
                 "amount": payment_amount,
-                "principal_portion": principal / num_payments,
-                "interest_portion": payment_amount - (principal / num_payments)
-            })
-            
-            current_date += timedelta(days=7)
-        
-        return schedule
+                "principal_portion": principal_portion,
+                "interest_portion": interest_portion
+            }
+            for number in range(1, num_payments + 1)
+        ]
     
     def _calculate_total_cost(self, principal: float, annual_rate: float, term_days: int) -> float:
         """Calcula costo total del adelanto"""
@@ -629,14 +841,42 @@ class AdvanceProcessor:
 class ReconciliationEngine:
     """Motor de conciliación de efectivo"""
     
+    def __init__(self, max_concurrency: int = 20):
+        # Acota las conciliaciones simultáneas de un lote para no saturar BD/APIs bancarias
+        self._batch_sem = asyncio.Semaphore(max_concurrency)
+    
+    async def reconcile_batch(self, business_ids: List[str], period: str = "daily") -> Dict[str, Dict]:
+        """Concilia varios negocios concurrentemente (ej. cierre nocturno)
+        
+        Un negocio que falla no descarta el lote: su entrada es {"error": ...}.
+        """
+        
+        results = await asyncio.gather(
+            *(self._reconcile_bounded(business_id, period) for business_id in business_ids),
+            return_exceptions=True
+        )
+        
+        reconciliations = {}
+        for business_id, result in zip(business_ids, results):
+            if isinstance(result, Exception):
+                result = {"error": f"{type(result).__name__}: {result}"}
+            reconciliations[business_id] = result
+        return reconciliations
+    
+    async def _reconcile_bounded(self, business_id: str, period: str) -> Dict:
+        """Concilia un negocio dentro del límite de concurrencia del lote"""
+        async with self._batch_sem:
+            return await self.reconcile_cash_flow(business_id, period)
+    
     async def reconcile_cash_flow(self, business_id: str, period: str = "daily") -> Dict:
         """Reconcilia flujo de efectivo por período"""
         
-        # Obtener transacciones del período
-        transactions = await self._get_period_transactions(business_id, period)
-        
-        # Obtener saldos bancarios
-        bank_balances = await self._get_bank_balances(business_id)
+        # Transacciones del período, saldos bancarios e items pendientes son independientes
+        transactions, bank_balances, pending_items = await asyncio.gather(
+            self._get_period_transactions(business_id, period),
+            self._get_bank_balances(business_id),
+            self._check_pending_items()
+        )
         
         # Calcular posición teórica vs real
         theoretical_position = self._calculate_theoretical_position(transactions)
@@ -644,12 +884,13 @@ class ReconciliationEngine:
         
         discrepancy = actual_position - theoretical_position
         
-        # Identificar discrepancias
-        discrepancies = await self._identify_discrepancies(
+        # Discrepancias, sugerencias y acciones en una sola pasada
+        discrepancies, reconciliation_items, actions = self._process_discrepancies(
             theoretical_position, 
             actual_position, 
             transactions,
-            bank_balances
+            bank_balances,
+            pending_items
         )
         
         return {
@@ -658,8 +899,8 @@ class ReconciliationEngine:
             "actual_position": actual_position,
             "discrepancy": discrepancy,
             "discrepancies": discrepancies,
-            "reconciliation_items": await self._suggest_reconciliation_items(discrepancies),
-            "actions_required": await self._suggest_actions(discrepancies)
+            "reconciliation_items": reconciliation_items,
+            "actions_required": actions
         }
     
     async def _get_period_transactions(self, business_id: str, period: str) -> List[Dict]:
@@ -684,77 +925,73 @@ class ReconciliationEngine:
     def _calculate_theoretical_position(self, transactions: List[Dict]) -> float:
         """Calcula posición teórica basada en transacciones"""
         
-        inflows = sum(t["amount"] for t in transactions if t["type"] == "inflow")
-        outflows = sum(t["amount"] for t in transactions if t["type"] == "outflow")
+        # Columnas planas para el kernel (monto y signo), llenadas en una sola pasada
+        amounts = array('d')
+        signs = array('b')
+        add_amount, add_sign, sign_of = amounts.append, signs.append, _TRANSACTION_SIGNS.get
+        for t in transactions:
+            add_amount(t["amount"])
+            add_sign(sign_of(t["type"], 0))
         
         # Agregar saldo inicial (simulado)
         initial_balance = 44000.00
         
-        return initial_balance + inflows - outflows
+        return initial_balance + signed_total(amounts, signs)
     
-    async def _identify_discrepancies(self, theoretical, actual, transactions, balances) -> List[Dict]:
-        """Identifica discrepancias específicas"""
+    async def _check_pending_items(self) -> List[Dict]:
+        """Verifica items pendientes"""
+        # Simulación de items pendientes
+        return [
+            {"amount": 2500, "description": "Cheque pendiente de cobro"},
+            {"amount": -800, "description": "Cargo bancario no registrado"}
+        ]
+    
+    def _process_discrepancies(self, theoretical, actual, transactions, balances, pending_items):
+        """Identifica discrepancias y, en la misma pasada, sugiere items de conciliación y acciones
+        
+        Retorna (discrepancies, reconciliation_items, actions_required).
+        """
         
         discrepancies = []
+        suggestions = []
+        high_severity_count = 0
         
         total_discrepancy = actual - theoretical
         
-        if abs(total_discrepancy) > 100:  # Discrepancia > $100 MXN
+        magnitude = abs(total_discrepancy)
+        if magnitude > 100:  # Discrepancia > $100 MXN
+            is_high = magnitude > 1000
+            high_severity_count += is_high
             discrepancies.append({
                 "type": "position_discrepancy",
                 "amount": total_discrepancy,
                 "description": f"Diferencia entre posición teórica y real: ${total_discrepancy:,.2f}",
-                "severity": "high" if abs(total_discrepancy) > 1000 else "medium"
+                "severity": "high" if is_high else "medium"
+            })
+            suggestions.append({
+                "action": "investigate_discrepancy",
+                "amount": total_discrepancy,
+                "description": "Investigar origen de la discrepancia"
             })
         
         # Verificar transacciones pendientes
-        pending_items = await self._check_pending_items()
         for item in pending_items:
+            amount = item["amount"]
             discrepancies.append({
                 "type": "pending_transaction",
-                "amount": item["amount"],
+                "amount": amount,
                 "description": f"Transacción pendiente: {item['description']}",
                 "severity": "medium"
             })
+            suggestions.append({
+                "action": "register_transaction",
+                "amount": amount,
+                "description": "Registrar transacción pendiente en sistema"
+            })
         
-        return discrepancies
-    
-    async def _check_pending_items(self) -> List[Dict]:
-        """Verifica items pendientes"""
-        # Simulación de items pendientes
-        return [
-            {"amount": 2500, "description": "Cheque pendiente de cobro"},
-            {"amount": -800, "description": "Cargo bancario no registrado"}
-        ]
-    
-    async def _suggest_reconciliation_items(self, discrepancies: List[Dict]) -> List[Dict]:
-        """Sugiere items de conciliación"""
-        
-        suggestions = []
-        
-        for discrepancy in discrepancies:
-            if discrepancy["type"] == "pending_transaction":
-                suggestions.append({
-                    "action": "register_transaction",
-                    "amount": discrepancy["amount"],
-                    "description": "Registrar transacción pendiente en sistema"
-                })
-            elif discrepancy["type"] == "position_discrepancy":
-                suggestions.append({
-                    "action": "investigate_discrepancy",
-                    "amount": discrepancy["amount"],
-                    "description": "Investigar origen de la discrepancia"
-                })
-        
-        return suggestions
-    
-    async def _suggest_actions(self, discrepancies: List[Dict]) -> List[str]:
-        """Sugiere acciones correctivas"""
-        
+        # Acciones correctivas
         actions = []
         
-        high_severity_count = sum(1 for d in discrepancies if d.get("severity") == "high")
-        
         if high_severity_count > 0:
             actions.append("Revisar inmediatamente las discrepancias de alta severidad")
             
@@ -763,4 +1000,4 @@ class ReconciliationEngine:
             
         actions.append("Actualizar registros contables con items identificados")
         
-        return actions
\ No newline at end of file
+        return discrepancies, suggestions, actions
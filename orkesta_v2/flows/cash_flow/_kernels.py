@@ -0,0 +1,87 @@
+"""
+Kernels numéricos de cash flow
+Recorren columnas planas (array('d') / array('b')); se compilan con Numba cuando está disponible
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback sin Numba: deja la función en Python puro"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True)
+def signed_total(amounts, signs):
+    """Suma de montos con signo (+1 entrada, -1 salida, 0 ignorado)"""
+    total = 0.0
+    for i in range(len(amounts)):
+        total += amounts[i] * signs[i]
+    return total
+
+
+@njit(cache=True)
+def flow_stats(flows):
+    """Promedio y desviación absoluta media de los flujos mensuales"""
+    n = len(flows)
+    total = 0.0
+    for i in range(n):
+        total += flows[i]
+    mean = total / n
+
+    deviation = 0.0
+    for i in range(n):
+        deviation += abs(flows[i] - mean)
+
+    return mean, deviation / n
+
+
+# Score de capacidad por ratio monto/flujo mensual (cotas exclusivas):
+# <20% -> 1.0, <50% -> 0.8, <100% -> 0.6, resto -> 0.3
+AMOUNT_RATIO_BOUNDS = (0.2, 0.5, 1.0)
+AMOUNT_RATIO_SCORES = (1.0, 0.8, 0.6, 0.3)
+
+# Bits de la máscara de factores de riesgo
+RISK_HIGH_VOLATILITY = 1
+RISK_DECLINING_TREND = 2
+RISK_HIGH_DEBT = 4
+
+
+@njit(cache=True)
+def capacity_and_risks(flows, requested_amount, current_debt):
+    """Capacidad de pago y factores de riesgo sobre los flujos mensuales
+
+    Retorna (avg_monthly_flow, debt_to_flow_ratio, capacity_score, risk_mask).
+    """
+    n = len(flows)
+    avg_flow = 0.0
+    mean_deviation = 0.0
+    if n > 0:
+        avg_flow, mean_deviation = flow_stats(flows)
+
+    debt_ratio = current_debt / max(avg_flow, 1.0)
+
+    # Score base según ratio de cantidad solicitada vs flujo promedio
+    amount_ratio = requested_amount / max(avg_flow, 1.0)
+    band = 0
+    while band < len(AMOUNT_RATIO_BOUNDS) and amount_ratio >= AMOUNT_RATIO_BOUNDS[band]:
+        band += 1
+
+    # Penalizar si deuda > 50% del flujo
+    debt_penalty = max(0.0, debt_ratio - 0.5) * 0.5
+    capacity_score = max(0.0, AMOUNT_RATIO_SCORES[band] - debt_penalty)
+
+    risk_mask = 0
+    if n > 1 and mean_deviation / avg_flow > 0.3:  # 30% de volatilidad
+        risk_mask |= RISK_HIGH_VOLATILITY
+    if n >= 3 and flows[n - 1] < flows[n - 3] * 0.8:
+        risk_mask |= RISK_DECLINING_TREND
+    if debt_ratio > 0.8:
+        risk_mask |= RISK_HIGH_DEBT
+
+    return avg_flow, debt_ratio, capacity_score, risk_mask
@@ -0,0 +1,159 @@
+"""
+Tests de cache y helpers del flujo de efectivo
+"""
+
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from orkesta_v2.flows import cash_flow
+from orkesta_v2.flows.cash_flow import CashFlowAnalyzer, _TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cash_flow.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = _TTLCache(ttl=5.0)
+    cache.set('b1', {'balance': 1})
+
+    clock[0] += 4.9
+    assert cache.get('b1') == {'balance': 1}
+
+    clock[0] += 0.1
+    assert cache.get('b1') is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = _TTLCache(ttl=60.0, maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # 'b' queda como el menos usado
+    cache.set('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_ttl_cache_values_are_isolated_from_callers(clock):
+    cache = _TTLCache(ttl=60.0)
+    value = {'flows': [1, 2]}
+    cache.set('b1', value)
+
+    value['flows'].append(3)
+    hit = cache.get('b1')
+    hit['flows'].append(4)
+
+    assert cache.get('b1') == {'flows': [1, 2]}
+
+
+def test_mutating_cash_position_does_not_corrupt_cache():
+    analyzer = CashFlowAnalyzer()
+
+    async def main():
+        first = await analyzer.get_current_position('b1')
+        snapshot = dict(first)
+        first.clear()
+        return snapshot, await analyzer.get_current_position('b1')
+
+    snapshot, second = asyncio.run(main())
+    assert second == snapshot
+
+
+def test_optimize_payment_dates_accepts_rows_and_columns():
+    analyzer = CashFlowAnalyzer()
+
+    async def main():
+        columns = await analyzer.project_cash_flow_columns('b1', 30)
+        rows = await analyzer.project_cash_flow('b1', 30)
+        return (
+            await analyzer.optimize_payment_dates(2000, columns, {}),
+            await analyzer.optimize_payment_dates(2000, rows, {}),
+            await analyzer.optimize_payment_dates(2000, {}, {})
+        )
+
+    from_columns, from_rows, empty = asyncio.run(main())
+    assert from_columns
+    assert [(d['amount'], d['confidence']) for d in from_rows] == \
+        [(d['amount'], d['confidence']) for d in from_columns]
+    assert empty == []
+
+
+def test_parse_request_accepts_null_urgency_and_currency():
+    manager = cash_flow.CashFlowManager(core_engine=None)
+    request = manager._parse_request({
+        'business_id': 'b1', 'amount': '1500', 'urgency': None, 'currency': None
+    })
+    assert request.amount == 1500.0
+    assert request.urgency is None and request.currency is None
+
+
+def test_advance_references_do_not_collide():
+    processors = [cash_flow.AdvanceProcessor(), cash_flow.AdvanceProcessor()]
+    suffixes = {p._reference_suffix('b1') for p in processors for _ in range(500)}
+    assert len(suffixes) == 1000
+
+
+def test_stable_references_share_business_prefix_but_stay_unique():
+    processors = [cash_flow.AdvanceProcessor(stable_references=True) for _ in range(2)]
+    suffixes = [p._reference_suffix('b1') for p in processors for _ in range(500)]
+
+    assert len(set(suffixes)) == len(suffixes)
+    assert len({suffix[:4] for suffix in suffixes}) == 1
+    assert processors[0]._reference_suffix('b2')[:4] != suffixes[0][:4]
+
+
+def test_reconcile_batch_reports_failures_per_business():
+    engine = cash_flow.ReconciliationEngine(max_concurrency=2)
+    running = [0, 0]  # actuales, máximo
+    original = engine.reconcile_cash_flow
+
+    async def reconcile(business_id, period="daily"):
+        running[0] += 1
+        running[1] = max(running)
+        try:
+            await asyncio.sleep(0.001)
+            if business_id == 'bad':
+                raise ConnectionError("banco no disponible")
+            return await original(business_id, period)
+        finally:
+            running[0] -= 1
+
+    engine.reconcile_cash_flow = reconcile
+    results = asyncio.run(engine.reconcile_batch(['a', 'bad', 'b', 'c', 'd']))
+
+    assert results['bad'] == {"error": "ConnectionError: banco no disponible"}
+    assert all('actual_position' in results[b] for b in 'abcd')
+    assert running[1] == 2
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_serialize_response_json_and_orjson_agree(monkeypatch, use_orjson):
+    if use_orjson and not cash_flow.ORJSON_AVAILABLE:
+        pytest.skip("orjson no instalado")
+    response = {
+        'status': cash_flow.CashFlowRequestType.CASH_POSITION,
+        'generated_at': datetime(2026, 1, 2, 3, 4, 5, 678),
+        'by_day': {1: 1500.0, 2: float('nan'), None: 0.0, 2.5: -float('inf')},
+        'liquidity': (0.5, float('inf')),
+        'negocio': 'Panadería Ñandú'
+    }
+
+    monkeypatch.setattr(cash_flow, 'ORJSON_AVAILABLE', False)
+    stdlib = cash_flow.serialize_response(response)
+    monkeypatch.setattr(cash_flow, 'ORJSON_AVAILABLE', use_orjson)
+    serialized = cash_flow.serialize_response(response)
+
+    assert serialized == stdlib
+    payload = json.loads(serialized)
+    assert payload['by_day'] == {'1': 1500.0, '2': None, 'null': 0.0, '2.5': None}
+    assert payload['liquidity'] == [0.5, None]
+    assert payload['status'] == 'cash_position'
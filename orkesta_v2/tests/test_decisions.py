@@ -0,0 +1,104 @@
+"""
+Tests de las decisiones del motor de reglas
+"""
+
+import asyncio
+import json
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from orkesta_v2.core.decisions import Decision, DecisionEngine, DecisionRuleEngine, DecisionType
+
+_CASES = [
+    ({'type': 'cash_flow_request', 'amount': 5000}, {'business_health_score': 0.9, 'payment_history_score': 0.9}, 0.1),
+    ({'type': 'cash_flow_request', 'amount': 20000}, {}, 0.1),
+    ({'type': 'cash_flow_request', 'amount': 90000}, {}, 0.1),
+    ({'channel': 'whatsapp'}, {'customer_tier': 'gold'}, 0.1),
+    ({'channel': 'whatsapp'}, {'customer_tier': 'new'}, 0.1),
+    ({'channel': 'whatsapp'}, {'customer_tier': 'bronze'}, 0.1),
+    ({'type': 'payment', 'payment_method': 'oxxo'}, {}, 0.1),
+    ({'type': 'payment', 'payment_method': 'cash'}, {}, 0.1),
+    ({'type': 'payment', 'payment_method': 'stripe'}, {}, 0.1),
+    ({'type': 'payment', 'payment_method': 'stripe'}, {}, 0.9),
+    ({'type': 'payment', 'payment_method': 'bitcoin'}, {}, 0.1),
+    ({}, {}, 0.1),
+    ({}, {}, 0.9),
+    ({}, {}, 0.5),
+]
+
+
+@pytest.mark.parametrize("data, context_analysis, risk_score", _CASES)
+def test_decision_actions_are_serializable(data, context_analysis, risk_score):
+    decision = DecisionRuleEngine().evaluate(data, context_analysis, risk_score, SimpleNamespace(confidence=0.95))
+
+    json.dumps(decision.actions, default=str)
+    asdict(decision)
+
+
+def test_mutating_actions_does_not_leak_into_later_decisions():
+    engine = DecisionRuleEngine()
+    data = {'type': 'payment', 'payment_method': 'oxxo'}
+
+    first = engine.evaluate(data, {}, 0.1, None)
+    first.actions[0]['voucher'] = 'ABC123'
+    first.actions.append({'type': 'extra'})
+
+    second = engine.evaluate(data, {}, 0.1, None)
+    assert 'voucher' not in second.actions[0]
+    assert len(second.actions) == 4
+
+
+def _payment(**overrides):
+    data = {'type': 'payment', 'payment_method': 'stripe', 'amount': 100, 'location': {'country': 'MX'}}
+    data.update(overrides)
+    return data
+
+
+def test_engine_survives_multiple_event_loops():
+    engine = DecisionEngine()
+    verification = SimpleNamespace(confidence=0.95)
+
+    first = asyncio.run(engine.make_decision(_payment(), {}, verification))
+    second = asyncio.run(engine.make_decision(_payment(), {}, verification))
+
+    assert first.type is second.type is DecisionType.APPROVE
+
+
+def test_bad_decision_does_not_fail_concurrent_decisions():
+    engine = DecisionEngine()
+    verification = SimpleNamespace(confidence=0.95)
+
+    async def main():
+        return await asyncio.gather(
+            engine.make_decision(_payment(), {}, verification),
+            engine.make_decision(_payment(amount='x'), {}, verification),
+            engine.make_decision(_payment(), {}, None),
+            engine.make_decision(_payment(), {}, verification),
+            return_exceptions=True
+        )
+
+    first, bad_amount, no_verification, last = asyncio.run(main())
+    assert isinstance(first, Decision) and isinstance(last, Decision)
+    assert isinstance(bad_amount, TypeError)
+    assert isinstance(no_verification, AttributeError)
+
+
+@pytest.mark.parametrize("data, expected", [
+    ({'type': ['payment'], 'payment_method': 'oxxo'}, DecisionType.REVIEW),          # default
+    ({'type': {'a': 1}, 'channel': 'whatsapp'}, DecisionType.MODIFY),              # WhatsApp
+    ({'type': 'payment', 'channel': ['whatsapp'], 'payment_method': 'cash'}, DecisionType.ESCALATE),
+    ({'type': 'cash_flow_request', 'channel': {}, 'amount': 90000}, DecisionType.ESCALATE),
+])
+def test_unhashable_type_or_channel_falls_through(data, expected):
+    decision = DecisionRuleEngine().evaluate(data, {}, 0.5, SimpleNamespace(confidence=0.5))
+    assert decision.type is expected
+
+
+def test_unhashable_payment_method_is_unsupported():
+    decision = DecisionRuleEngine().evaluate(
+        {'type': 'payment', 'payment_method': ['oxxo']}, {}, 0.1, SimpleNamespace(confidence=0.95)
+    )
+    assert decision.type is DecisionType.REJECT
+    assert decision.reasoning == "Método de pago no soportado: ['oxxo']"
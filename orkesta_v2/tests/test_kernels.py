@@ -0,0 +1,98 @@
+"""
+Tests de los kernels numéricos (con Numba o con el fallback en Python puro)
+"""
+
+from array import array
+
+import pytest
+
+from orkesta_v2.core.decisions import _kernels as decision_kernels
+from orkesta_v2.flows.cash_flow import _kernels as cash_flow_kernels
+
+
+@pytest.mark.parametrize("kernels", [decision_kernels, cash_flow_kernels])
+def test_njit_fallback_is_identity(kernels):
+    if kernels.NUMBA_AVAILABLE:
+        pytest.skip("Numba instalado: los kernels se compilan")
+
+    def fn(x):
+        return x + 1
+
+    assert kernels.njit(fn) is fn
+    assert kernels.njit(cache=True)(fn) is fn
+
+
+def test_weighted_risk():
+    assert decision_kernels.weighted_risk(0.0, 0.0, 0.0, 0.0, 0.0) == 0.0
+    assert decision_kernels.weighted_risk(0.1, 0.5, 1.0, 0.1, 0.05) == pytest.approx(
+        0.1 * 0.3 + 0.5 * 0.25 + 1.0 * 0.2 + 0.1 * 0.15 + 0.05 * 0.1
+    )
+    # Acotado a 1.0
+    assert decision_kernels.weighted_risk(1.0, 1.0, 1.0, 1.0, 1.0) == 1.0
+
+
+@pytest.mark.parametrize("cash_flow_score, trend, age_months, expected", [
+    (0.0, 0, 0, 0.3),
+    (0.2, 1, 0, 0.6),
+    (1.0, 2, 0, 0.9),            # cash flow acotado a 0.4
+    (1.0, 2, 240, 1.0),          # edad acotada a 0.1
+    (0.1, 0, 12, 0.5),
+])
+def test_business_health(cash_flow_score, trend, age_months, expected):
+    assert decision_kernels.business_health(cash_flow_score, trend, age_months) == pytest.approx(expected)
+
+
+def test_sales_trend_codes_match_kernel_branches():
+    growing = decision_kernels.SALES_TREND_CODES['growing']
+    stable = decision_kernels.SALES_TREND_CODES['stable']
+    assert decision_kernels.business_health(0.0, growing, 0) == pytest.approx(0.5)
+    assert decision_kernels.business_health(0.0, stable, 0) == pytest.approx(0.4)
+
+
+def test_signed_total():
+    amounts = array('d', [15000, 8000, 5000, 3000, 999])
+    signs = array('b', [1, 1, -1, -1, 0])
+    assert cash_flow_kernels.signed_total(amounts, signs) == 15000.0
+    assert cash_flow_kernels.signed_total(array('d'), array('b')) == 0.0
+
+
+def test_flow_stats():
+    mean, mean_abs_dev = cash_flow_kernels.flow_stats(array('d', [100, 200, 300, 400]))
+    assert mean == 250.0
+    assert mean_abs_dev == 100.0
+
+
+@pytest.mark.parametrize("flows, requested, debt, expected", [
+    # Sin historial: promedio 0, ratios contra 1.0
+    ([], 0.1, 0.0, (0.0, 0.0, 1.0, 0)),
+    ([], 5000.0, 0.0, (0.0, 0.0, 0.3, 0)),
+    # Bandas de monto: <20% -> 1.0, <50% -> 0.8, <100% -> 0.6, resto -> 0.3
+    ([20000.0, 20000.0], 3999.0, 0.0, (20000.0, 0.0, 1.0, 0)),
+    ([20000.0, 20000.0], 4000.0, 0.0, (20000.0, 0.0, 0.8, 0)),
+    ([20000.0, 20000.0], 10000.0, 0.0, (20000.0, 0.0, 0.6, 0)),
+    ([20000.0, 20000.0], 20000.0, 0.0, (20000.0, 0.0, 0.3, 0)),
+    # Penalización por deuda > 50% del flujo, acotada en 0
+    ([20000.0, 20000.0], 1000.0, 14000.0, (20000.0, 0.7, 0.9, 0)),
+    ([20000.0, 20000.0], 1000.0, 60000.0, (20000.0, 3.0, 0.0, 4)),
+])
+def test_capacity_and_risks(flows, requested, debt, expected):
+    avg_flow, debt_ratio, score, mask = cash_flow_kernels.capacity_and_risks(array('d', flows), requested, debt)
+    assert (avg_flow, debt_ratio, mask) == (expected[0], expected[1], expected[3])
+    assert score == pytest.approx(expected[2])
+    assert isinstance(score, float)
+
+
+def test_capacity_risk_mask_bits():
+    capacity_and_risks = cash_flow_kernels.capacity_and_risks
+
+    volatile = capacity_and_risks(array('d', [1000, 30000, 1000, 30000]), 100.0, 0.0)[3]
+    declining = capacity_and_risks(array('d', [10000, 10000, 7000]), 100.0, 0.0)[3]
+    all_risks = capacity_and_risks(array('d', [30000, 1000, 1000]), 100.0, 50000.0)[3]
+
+    assert volatile == cash_flow_kernels.RISK_HIGH_VOLATILITY
+    assert declining == cash_flow_kernels.RISK_DECLINING_TREND
+    assert all_risks == (
+        cash_flow_kernels.RISK_HIGH_VOLATILITY
+        | cash_flow_kernels.RISK_DECLINING_TREND
+        | cash_flow_kernels.RISK_HIGH_DEBT
+    )
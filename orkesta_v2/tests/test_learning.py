@@ -0,0 +1,230 @@
+"""
+Tests del almacén columnar y la cola de aprendizaje
+"""
+
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from orkesta_v2.core import learning
+from orkesta_v2.core.decisions import Decision, DecisionType
+from orkesta_v2.core.learning import ContinuousLearningEngine, PatternStore, dequantize
+
+
+def _features(**overrides):
+    features = {
+        'amount': 1500,
+        'hour_of_day': 10,
+        'day_of_week': 2,
+        'customer_age_days': 40,
+        'previous_transactions': 7,
+        'verification_confidence': 0.93,
+        'verification_level': 'ENHANCED'
+    }
+    features.update(overrides)
+    return features
+
+
+def test_extend_coerces_bad_values_row_by_row():
+    store = PatternStore()
+    store.extend([
+        (1.0, _features()),
+        (2.0, _features(amount='x', previous_transactions=None, verification_confidence='alta')),
+        (3.0, _features(customer_age_days=float('nan')))
+    ])
+
+    assert len(store) == 3
+    assert list(store.columns['amount']) == [1500.0, 0.0, 1500.0]
+    assert list(store.columns['previous_transactions']) == [7.0, 0.0, 7.0]
+    assert list(store.columns['customer_age_days']) == [40.0, 40.0, 0.0]
+    assert dequantize(store.columns['verification_confidence'][0]) == 0.93
+    assert store.columns['verification_confidence'][1] == 0
+
+
+def test_capacity_trims_oldest_with_slack():
+    store = PatternStore(capacity=80)
+
+    # Hasta capacity + capacity // 8 no se recorta
+    store.extend([(float(i), _features()) for i in range(90)])
+    assert len(store) == 90
+
+    store.extend([(float(i), _features()) for i in range(90, 91)])
+    assert len(store) == 80
+    assert store.columns['timestamp'][0] == 11.0
+    assert all(len(column) == 80 for column in store.columns.values())
+
+
+def test_drop_before_is_inclusive():
+    store = PatternStore()
+    store.extend([(float(i), _features()) for i in range(10)])
+    store.drop_before(4.0)
+    assert list(store.columns['timestamp']) == [5.0, 6.0, 7.0, 8.0, 9.0]
+
+
+def test_bad_event_does_not_drop_the_batch():
+    engine = ContinuousLearningEngine()
+    decision = Decision(type=DecisionType.APPROVE, confidence=0.9, reasoning="ok", actions=[])
+
+    async def main():
+        await asyncio.gather(
+            engine.record_interaction({'amount': 100}, decision, {'total_transactions': None}),
+            *(engine.record_interaction({'amount': 100}, decision, {}) for _ in range(5))
+        )
+        await engine.flush()
+
+    asyncio.run(main())
+    assert len(engine.pattern_learner.patterns['successful_transactions']) == 6
+    assert len(engine.outcome_tracker.pending_outcomes) == 6
+
+
+def test_malformed_event_is_skipped():
+    engine = ContinuousLearningEngine()
+    decision = Decision(type=DecisionType.REJECT, confidence=0.9, reasoning="no", actions=[])
+
+    async def main():
+        await engine.record_interaction(None, decision, {})
+        await engine.record_interaction({'amount': 5}, decision, {})
+        await engine.flush()
+
+    asyncio.run(main())
+    assert len(engine.pattern_learner.patterns['failed_transactions']) == 1
+    assert len(engine.outcome_tracker.pending_outcomes) == 2
+
+
+def test_recorded_decision_id_reports_outcome():
+    engine = ContinuousLearningEngine()
+    decision = Decision(type=DecisionType.APPROVE, confidence=0.9, reasoning="ok", actions=[])
+
+    async def main():
+        decision_id = await engine.record_interaction({'amount': 100}, decision, {})
+        await engine.flush()
+        assert decision_id in engine.outcome_tracker.pending_outcomes
+        await engine.learn_from_outcome(decision_id, {'result': 'completed'})
+        return decision_id
+
+    decision_id = asyncio.run(main())
+    tracker = engine.outcome_tracker
+    assert decision_id not in tracker.pending_outcomes
+    assert tracker.completed_outcomes[-1]['accuracy'] == 1.0
+
+
+def test_pending_outcomes_are_bounded():
+    engine = ContinuousLearningEngine()
+    engine.outcome_tracker.max_pending = 3
+    decision = Decision(type=DecisionType.REVIEW, confidence=0.6, reasoning="?", actions=[])
+
+    async def main():
+        ids = [await engine.record_interaction({}, decision, {}) for _ in range(5)]
+        await engine.flush()
+        return ids
+
+    ids = asyncio.run(main())
+    assert list(engine.outcome_tracker.pending_outcomes) == ids[2:]
+
+
+def test_process_request_attaches_decision_id():
+    from orkesta_v2.core import OrkestaCore
+
+    core = OrkestaCore()
+
+    async def main():
+        decision = await core.process_request(
+            {'amount': 100, 'location': {'country': 'MX'}},
+            {'customer_age_days': 400, '_current_hour': 12}
+        )
+        await core.learning.flush()
+        return decision
+
+    decision = asyncio.run(main())
+    assert isinstance(decision, Decision)
+    assert decision.decision_id in core.learning.outcome_tracker.pending_outcomes
+
+
+def test_outcome_reported_before_drain_is_recorded():
+    from orkesta_v2.core import OrkestaCore
+
+    core = OrkestaCore()
+
+    async def main():
+        decision = await core.process_request(
+            {'amount': 100, 'location': {'country': 'MX'}},
+            {'customer_age_days': 400, '_current_hour': 12}
+        )
+        # Sin flush: el drenado de la cola todavía no corrió
+        await core.learning.learn_from_outcome(decision.decision_id, {'result': 'completed'})
+        return decision
+
+    decision = asyncio.run(main())
+    tracker = core.learning.outcome_tracker
+    assert decision.decision_id not in tracker.pending_outcomes
+    assert len(tracker.completed_outcomes) == 1
+
+
+def _run_on_fresh_loops(coro_fn, runs=2):
+    """Corre coro_fn en loops distintos, dejando cada loop abierto con sus tareas pendientes"""
+    loops = []
+    try:
+        for _ in range(runs):
+            loop = asyncio.new_event_loop()
+            loops.append(loop)
+            loop.run_until_complete(coro_fn())
+    finally:
+        for loop in loops:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+
+def test_engine_survives_event_loop_change():
+    engine = ContinuousLearningEngine()
+    decision = Decision(type=DecisionType.APPROVE, confidence=0.9, reasoning="ok", actions=[])
+
+    async def main():
+        await engine.record_interaction({'amount': 100}, decision, {})
+        await engine.flush()
+
+    # Dos asyncio.run y dos loops que siguen abiertos con el drenado pendiente
+    asyncio.run(main())
+    asyncio.run(main())
+    _run_on_fresh_loops(main)
+
+    assert len(engine.pattern_learner.patterns['successful_transactions']) == 4
+
+
+def _event_with_awkward_values():
+    from orkesta_v2.core.learning import LearningEvent, LearningEventType
+
+    decision = Decision(
+        type=DecisionType.REVIEW, confidence=0.6, reasoning="revisión", actions=[{"type": "queue_for_review"}],
+        expiry=datetime(2026, 1, 2, 3, 4, 5, 678)
+    )
+    return LearningEvent(
+        event_type=LearningEventType.DECISION_MADE,
+        timestamp=datetime(2026, 1, 2, 3, 4, 5),
+        data={1: 'uno', None: 'nada', 2.5: 'dos y medio', True: 'sí', 'amount': float('nan')},
+        context={'flows': [float('inf'), -float('inf'), 1.5], 'ciudad': 'Querétaro'},
+        outcome={'decision': decision},
+        event_id=7
+    )
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_serialize_event_json_and_orjson_agree(monkeypatch, use_orjson):
+    if use_orjson and not learning.ORJSON_AVAILABLE:
+        pytest.skip("orjson no instalado")
+    event = _event_with_awkward_values()
+
+    monkeypatch.setattr(learning, 'ORJSON_AVAILABLE', False)
+    stdlib = learning.serialize_event(event)
+    monkeypatch.setattr(learning, 'ORJSON_AVAILABLE', use_orjson)
+    serialized = learning.serialize_event(event)
+
+    assert serialized == stdlib
+    payload = json.loads(serialized)
+    assert payload['data'] == {'1': 'sí', 'null': 'nada', '2.5': 'dos y medio', 'amount': None}
+    assert payload['context']['flows'] == [None, None, 1.5]
+    assert payload['outcome']['decision']['type'] == 'review'
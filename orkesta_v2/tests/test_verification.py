@@ -0,0 +1,69 @@
+"""
+Tests del motor de verificación
+"""
+
+import asyncio
+import itertools
+
+import pytest
+
+from orkesta_v2.core import verification
+from orkesta_v2.core.verification import AIVerificationEngine
+
+
+def _verify(data, context):
+    return asyncio.run(AIVerificationEngine().verify_input(data, context))
+
+
+def test_verify_input_does_not_write_into_context():
+    context = {'customer_age_days': 400}
+    _verify({'amount': 100}, context)
+    assert context == {'customer_age_days': 400}
+
+
+def test_supplied_hour_is_used_for_business_hours():
+    night = _verify({'amount': 100}, {'customer_age_days': 400, '_current_hour': 3})
+    midnight = _verify({'amount': 100}, {'customer_age_days': 400, '_current_hour': 0})
+    day = _verify({'amount': 100}, {'customer_age_days': 400, '_current_hour': 12})
+
+    assert 'outside_business_hours' in night.flags
+    assert 'outside_business_hours' in midnight.flags
+    assert 'outside_business_hours' not in day.flags
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_verify_batch_matches_verify_input(monkeypatch, use_numpy):
+    if use_numpy and not verification.NUMPY_AVAILABLE:
+        pytest.skip("NumPy no instalado")
+    monkeypatch.setattr(verification, 'NUMPY_AVAILABLE', use_numpy)
+
+    engine = AIVerificationEngine()
+    monkeypatch.setattr(
+        engine.anomaly_detector, 'is_location_anomaly',
+        lambda location, context: location == 'far'
+    )
+
+    rows = list(itertools.product(
+        (500, 9_000, 40_000, 60_000, 150_000),  # monto
+        (1_000, 20_000),                        # promedio del cliente
+        (0, 3, 12, 22, 23),                     # hora
+        (100_000, 30_000),                      # límite diario
+        (False, True)                           # anomalía de ubicación
+    ))
+
+    expected = []
+    for amount, avg_amount, hour, daily_limit, far in rows:
+        result = asyncio.run(engine.verify_input(
+            {'amount': amount, 'location': 'far' if far else 'near'},
+            {
+                'transaction_amount': amount,
+                'customer_age_days': 400,
+                'user_avg_amount': avg_amount,
+                '_current_hour': hour,
+                'daily_limit': daily_limit
+            }
+        ))
+        expected.append((result.is_valid, result.confidence))
+
+    valid, confidence = AIVerificationEngine.verify_batch(*(list(column) for column in zip(*rows)))
+    assert [(bool(v), float(c)) for v, c in zip(valid, confidence)] == expected